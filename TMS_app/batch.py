@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+headless analysis of an experiment directory tree, without tkinter; summary is printed as json to stdout
+
+    python -m TMS_app.batch <experiment root> [--workers N] [--output DIR] [--profile FILE]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from TMS_app.tools.model import Model
+
+BATCH_EVENTS = ("directory done", "directory skipped", "directory failed")
+
+
+class EventCollector:
+    def __init__(self):
+        """
+        stand-in for the model->gui queue; keeps batch progress events and drops plotting data
+        self.events - list of (order, data) tuples
+        """
+        self.events = []
+
+    def put(self, message):
+        order, data = message
+        if order in BATCH_EVENTS:
+            self.events.append((order, data))
+
+    def directories(self, order):
+        return [data[0] if order == "directory failed" else data for event, data in self.events if event == order]
+
+
+def run_batch(root, workers=1, output_dir=None, incremental=True, use_parse_cache=True, memory_mb=1024,
+              profile=None):
+    """
+    analysing all directories of an experiment, as the automatic mode of the app does
+    :param root: string path to experiment directory
+    :param workers: number of processes analysing experiment directories
+    :param output_dir: directory mirroring the experiment tree for saved files, None to save next to input files
+    :param incremental: bool; skip directories already analysed with unchanged inputs and parameters
+    :param use_parse_cache: bool; keep parsed files in sidecar .npy caches
+    :param memory_mb: memory budget for spectra of loaded optical cycles [MB]
+    :param profile: string path to .json or .csv file for profiler spans, True to only summarize them, None to not
+    profile
+    :return: dict with summary of the run
+    """
+    events = EventCollector()
+    model = Model(model_gui_queue=events, gui_model_queue=None, start_thread=False,
+                  workers=workers, output_root=output_dir, incremental=incremental, opto_memory_mb=memory_mb,
+                  profile=profile, send_plots=False)
+    model.use_parse_cache = use_parse_cache
+    start = time.perf_counter()
+    model.run_experiment(root)
+    wall_time = time.perf_counter() - start
+    failed = [{'directory': dir, 'error': error} for event, (dir, error) in
+              ((event, data) for event, data in events.events if event == "directory failed")]
+    iodm_range = None if model.iodm_range is None else [float(wavelength) for wavelength in model.iodm_range]
+    summary = {'root': os.path.abspath(root),
+               'output': None if output_dir is None else os.path.abspath(output_dir),
+               'workers': workers,
+               'iodm_range': iodm_range,
+               'done': events.directories("directory done"),
+               'skipped': events.directories("directory skipped"),
+               'failed': failed,
+               'timings': {'total': wall_time, 'stages': dict(model.timings)}}
+    if model.profiler.enabled:
+        summary['profile'] = model.profiler.summary()
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m TMS_app.batch",
+                                     description="analyse an experiment directory tree without the GUI")
+    parser.add_argument("root", help="experiment directory with ech_pr_*.csv and opto_*.csv files in subdirectories")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="number of worker processes (default: 1)")
+    parser.add_argument("-o", "--output", default=None,
+                        help="directory for saved files, mirroring the experiment tree (default: next to input files)")
+    parser.add_argument("-m", "--memory-mb", type=float, default=1024,
+                        help="memory budget for spectra of loaded optical cycles in MB (default: 1024)")
+    parser.add_argument("--full", action="store_true", help="analyse all directories, also the up-to-date ones")
+    parser.add_argument("--no-cache", action="store_true", help="don't use or write parsed file caches")
+    parser.add_argument("--profile", metavar="FILE", default=None,
+                        help="record wall time, cpu time, bytes and items of each stage per file and cycle, "
+                             "saved to FILE as .json or .csv")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log progress to stderr")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s: %(message)s')
+    if not os.path.isdir(args.root):
+        logging.error("no experiment directory: {}".format(args.root))
+        return 2
+    summary = run_batch(args.root, workers=max(1, args.workers), output_dir=args.output,
+                        incremental=not args.full, use_parse_cache=not args.no_cache, memory_mb=args.memory_mb,
+                        profile=args.profile)
+    json.dump(summary, sys.stdout, indent=2, ensure_ascii=False)
+    sys.stdout.write("\n")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,18 +3,32 @@
 from TMS_app.tools.Application import View
 from TMS_app.tools.model import Model
 from queue import Queue
+from TMS_app.tools.commands import JobScheduler
 from TMS_app.tools.logger import logger_setup
 import tkinter as tk
+import argparse
+import os
 
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m TMS_app.main")
+    parser.add_argument("--profile", metavar="FILE", default=None,
+                        help="record wall time, cpu time, bytes and items of analysis stages, "
+                             "saved to FILE as .json or .csv after each experiment")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
     gui_log_queue = logger_setup()
 
     model_gui_queue = Queue()
-    gui_model_queue = Queue()
+    gui_model_queue = JobScheduler()
 
     model = Model(model_gui_queue=model_gui_queue,
-                  gui_model_queue=gui_model_queue)
+                  gui_model_queue=gui_model_queue,
+                  workers=max(1, (os.cpu_count() or 1) - 1),
+                  profile=args.profile)
     gui_queues = {'log_stream': gui_log_queue,
                   'model_gui_queue': model_gui_queue,
                   'gui_model_queue': gui_model_queue}
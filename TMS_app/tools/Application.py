@@ -6,14 +6,22 @@ import threading
 import matplotlib
 import os
 import matplotlib.ticker as mtick
+from contextlib import contextmanager
 from tkinter import filedialog, scrolledtext, ttk
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+import numpy as np
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+from matplotlib.collections import LineCollection
 from matplotlib.figure import Figure
 from queue import Empty
-from TMS_app.tools.ec_dataset import ElectroChemCycle
+from TMS_app.tools import commands
+from TMS_app.tools.commands import Command
+from TMS_app.tools.plotting import FigureUpdater, autoscale, data_bounds, round_limits
 
 matplotlib.use('TkAgg')
 
+# lines kept in the log widget, older ones are removed; the log file has all of them
+MAX_LOG_LINES = 1000
+
 
 class View(tkinter.Frame):
     seaborn_colors = ['#4878d0', '#ee854a', '#6acc64', '#d65f5f', '#956cb4',
@@ -34,8 +42,6 @@ class View(tkinter.Frame):
         self.analysis_frame = None
 
         # data structures
-        self.optical_data = None
-        self.ec_data = None
         self.ec_range = None
 
         self.initialdir = "C:/Users/aerial triceratops/PycharmProjects/TechMatStrateg2/dane/"
@@ -58,43 +64,46 @@ class View(tkinter.Frame):
             except ValueError:
                 logging.info("order misshap: {}".format(record))
             else:
+                # plotting orders carry read-only payloads, see TMS_app.tools.payloads
                 if order == "draw ec":
-                    self.ec_data = ElectroChemCycle(data[2], uA=data[0], V=data[1], id=[None, None])
-                    cycle = self.cycle_number_increment(data[2])
-                    self.duck_frame.electrochemical_teardown()
-                    self.duck_frame.draw_electrochemical(cycle)
+                    self.param_frame.cycle_navigator.show_cycle(data['cycle'])
+                    cycle = self.cycle_number_increment(data['cycle'])
+                    self.duck_frame.draw_electrochemical(data, cycle)
                 elif order == "set pathname":
                     self.dirlabel_txt.set(data)
                 elif order == "all done":
                     self.param_frame.all_done()
+                elif order == "directory done":
+                    logging.info("done: {}".format(data))
+                elif order == "directory skipped":
+                    logging.info("up to date: {}".format(data))
+                elif order == "directory failed":
+                    logging.error("failed: {} ({})".format(data[0], data[1]))
                 elif order == "opto file loaded":
-                    self.gui_model_q.put(("draw opto cycle", None))
-                elif order == "draw opto":
-                    self.opto_frame.optical_data = data[0]
-                    cycle = self.cycle_number_increment(data[1])
-                    self.opto_frame.opto_teardown()
-                    try:
-                        self.opto_frame.draw_optical(cycle)
-                    except ValueError:
-                        logging.error("cannot draw optical data. ec file not loaded or opto file missing cycle")
-                elif order == 'number of cycles' and not self.automatic_mode:
-                    self.param_frame.cycle_buttons.no_cycles = data
-                    self.param_frame.cycle_buttons.update_no_cycles(data)
-                elif order == 'number of cycles' and self.automatic_mode:
-                    self.param_frame.cycle_buttons.no_cycles = data
+                    self.opto_frame.redraw_opto()
+                elif order in ["draw opto", "draw opto image"]:
+                    cycle = self.cycle_number_increment(data['cycle'])
+                    self.opto_frame.draw_optical(order, data, cycle)
+                elif order == 'cycle summaries':
+                    self.param_frame.cycle_navigator.set_summaries(data)
                 elif order in ['fit λ(V)', 'IODM(V)']:
-                    cycle = self.cycle_number_increment(data[2])
-                    self.analysis_frame.parameter_plotting(order, data[0], data[1], cycle)
+                    cycle = self.cycle_number_increment(data['cycle'])
+                    self.analysis_frame.parameter_plotting(order, data['x'], data['y'], cycle)
                 elif order == 'fit λ(V)+IODM(V)':
-                    cycle = self.cycle_number_increment(data[3])
-                    self.analysis_frame.two_parameter_plotting(data[0], data[1], data[2], cycle)
+                    cycle = self.cycle_number_increment(data['cycle'])
+                    self.analysis_frame.two_parameter_plotting(data['V'], data['iodm'], data['lbd'], cycle)
                 else:
                     logging.info("unrecognized order from model: {}".format(record))
         self.after(400, self.poll_data_queue)
 
     @staticmethod
     def cycle_number_increment(cycle):
-        return cycle[:-1] + str(int(cycle[-1]) + 1)
+        # cycles are numbered from 0 in files and from 1 in the GUI
+        prefix, separator, number = cycle.rpartition(' ')
+        try:
+            return prefix + separator + str(int(number) + 1)
+        except ValueError:
+            return cycle
 
     def setup_frames(self):
         self.duck_frame = DuckFrame(self, borderwidth=1)
@@ -139,6 +148,12 @@ class DuckFrame(tkinter.Frame):
         canvas = FigureCanvasTkAgg(self.duck_figure, master=self)
         canvas.get_tk_widget().grid(row=0)
         canvas.draw()
+        self.duck_updater = FigureUpdater(canvas)
+        self.duck_ax = None
+        self.duck_line = None
+        self.toolbar = NavigationToolbar2Tk(canvas, self, pack_toolbar=False)
+        self.toolbar.grid(row=1)
+        self.zoom = ZoomWatcher(self, self.send_zoom)
 
         self.ec_file_button = ttk.Button(self, text="Browse for ec data", command=self.askopenfile_ec_csv)
         self.ec_file_button.grid(row=4)
@@ -155,27 +170,42 @@ class DuckFrame(tkinter.Frame):
         if not filename:
             pass
         else:
-            self.parent.gui_model_q.put(("load ec csv", filename))
+            self.parent.gui_model_q.put(commands.LoadEcCsv(filename))
             self.parent.initialdir = os.path.dirname(filename)
 
-    def draw_electrochemical(self, cycle):
+    def setup_axes(self):
+        self.duck_ax = self.duck_figure.add_subplot(111)
+        self.duck_ax.set_xlabel('U [V]')
+        self.duck_ax.set_ylabel('I [uA]')
+        self.duck_line, = self.duck_ax.plot([], [])
+        self.duck_updater.animate(self.duck_line, self.duck_ax.title)
+        self.zoom.watch(self.duck_ax)
+
+    def send_zoom(self, limits):
+        self.parent.gui_model_q.put(commands.ZoomEc({'limits': limits, 'size': plot_size(self.duck_ax)}))
+
+    def draw_electrochemical(self, data, cycle):
+        """
+        :param data: "draw ec" payload
+        :param cycle: title of the plot
+        """
         logging.info("drawing electrochemical data")
-        duck_ax = self.duck_figure.add_subplot(111)
-        duck_ax.plot(self.parent.ec_data.V, self.parent.ec_data.uA)
-        duck_ax.set_xlabel('U [V]')
-        duck_ax.set_ylabel('I [uA]')
-        duck_ax.set_title(cycle)
-        self.duck_figure.tight_layout()
-        self.duck_figure.canvas.draw()
+        if self.duck_ax is None:
+            self.setup_axes()
+        with self.zoom.drawing_data():
+            self.duck_line.set_data(data['V'], data['uA'])
+            self.duck_ax.set_title(cycle)
+            if data['limits'] is None:
+                autoscale(self.duck_ax)
+                self.toolbar.update()
+                self.zoom.cancel()
+            self.duck_updater.redraw()
 
     def find_ec_range(self, cycle=0):
         logging.info(f"plotting cycle {cycle + 1}")
         self.current_cycle = cycle
         self.parent.gui_model_q.put(("draw ec cycle", cycle))
 
-    def electrochemical_teardown(self):
-        self.duck_figure.clf()
-
 
 class OptoFrame(tkinter.Frame):
     def __init__(self, root, *args, **kwargs):
@@ -186,6 +216,14 @@ class OptoFrame(tkinter.Frame):
         canvas = FigureCanvasTkAgg(self.opto_figure, master=self)
         canvas.get_tk_widget().grid(row=1, columnspan=2)
         canvas.draw()
+        self.opto_updater = FigureUpdater(canvas)
+        self.opto_ax = None
+        self.spectra_lines = None
+        self.spectra_image = None
+        self.opto_view = None
+        self.toolbar = NavigationToolbar2Tk(canvas, self, pack_toolbar=False)
+        self.toolbar.grid(row=2, columnspan=2)
+        self.zoom = ZoomWatcher(self, self.send_zoom)
 
         self.refresh_button = ttk.Button(self,
                                          text="Redraw",
@@ -194,29 +232,90 @@ class OptoFrame(tkinter.Frame):
                                                    text="Browse for optical data",
                                                    command=self.askopenfile_opto_csv)
 
+        self.view_option_string = tkinter.StringVar()
+        self.view_option = ttk.Combobox(self, textvariable=self.view_option_string, state="readonly")
+        self.view_option['values'] = ('spectra', 'heatmap')
+        self.view_option.current(0)
+        self.view_option.bind("<<ComboboxSelected>>", lambda event: self.redraw_opto())
+
+        self.view_option.grid(row=4, columnspan=2)
         self.refresh_button.grid(row=3, column=0)
         self.optical_reference_button.grid(row=3, column=1)
-        self.optical_data = None
 
     def redraw_opto(self):
         logging.info("redrawing optical data")
-        self.parent.gui_model_q.put(("draw opto cycle", None))
+        self.parent.gui_model_q.put(commands.DrawOptoCycle({'view': self.view_option_string.get(),
+                                                            'size': plot_size(self.opto_ax, self.opto_figure)}))
 
-    def opto_teardown(self):
-        self.opto_figure.clf()
+    def send_zoom(self, limits):
+        self.parent.gui_model_q.put(commands.ZoomOpto({'limits': limits, 'size': plot_size(self.opto_ax)}))
 
-    def draw_optical(self, cycle):
-        logging.info("please wait, drawing optical data")
-        opto_ax = self.opto_figure.add_subplot(111)
-        transmission, wavelength = self.optical_data.generate_data_for_plotting()
-        for meas in transmission:
-            opto_ax.plot(wavelength, transmission[meas])
-        opto_ax.yaxis.set_major_formatter(mtick.FormatStrFormatter('%.1e'))
-        opto_ax.set_xlabel('$\lambda$ [nm]')
-        opto_ax.set_ylabel('intensity [counts]')
-        opto_ax.set_title(cycle)
-        self.opto_figure.tight_layout()
-        self.opto_figure.canvas.draw()
+    def setup_axes(self, view):
+        """
+        rebuilding axes when the view changes
+        :param view: 'spectra' for every 20th spectrum as a line, 'heatmap' for all spectra of the cycle as an image
+        """
+        self.opto_figure.clf()
+        self.opto_updater.clear()
+        self.opto_view = view
+        self.opto_ax = self.opto_figure.add_subplot(111)
+        self.opto_ax.set_xlabel('$\lambda$ [nm]')
+        if view == 'heatmap':
+            self.opto_ax.set_ylabel('measurement')
+            self.spectra_image = self.opto_ax.imshow([[0]], aspect='auto', interpolation='nearest')
+            self.opto_figure.colorbar(self.spectra_image, ax=self.opto_ax, format='%.1e', label='intensity [counts]')
+            self.opto_updater.animate(self.spectra_image, self.opto_ax.title)
+        else:
+            self.opto_ax.yaxis.set_major_formatter(mtick.FormatStrFormatter('%.1e'))
+            self.opto_ax.set_ylabel('intensity [counts]')
+            # all spectra of a cycle in one artist, coloured by the color cycle as separate lines would be
+            colors = matplotlib.rcParams['axes.prop_cycle'].by_key()['color']
+            self.spectra_lines = LineCollection([], colors=colors)
+            self.opto_ax.add_collection(self.spectra_lines)
+            self.opto_updater.animate(self.spectra_lines, self.opto_ax.title)
+        self.zoom.watch(self.opto_ax)
+
+    def draw_optical(self, order, data, cycle):
+        """
+        :param order: "draw opto" for spectra as lines, "draw opto image" for spectra as an image
+        :param data: payload of the order
+        :param cycle: title of the plot
+        """
+        logging.info("drawing optical data")
+        view = 'heatmap' if order == "draw opto image" else 'spectra'
+        if view != self.opto_view:
+            self.setup_axes(view)
+        with self.zoom.drawing_data():
+            if view == 'heatmap':
+                self.draw_heatmap(data, cycle)
+            else:
+                self.draw_spectra(data, cycle)
+            if data['limits'] is None:
+                self.toolbar.update()
+                self.zoom.cancel()
+            self.opto_updater.redraw()
+
+    def draw_heatmap(self, data, cycle):
+        # image of at most one pixel per screen pixel, so drawing time doesn't depend on the number of spectra
+        image = data['image']
+        first_lbd, last_lbd, first_id, last_id = data['extent']
+        self.spectra_image.set_data(image)
+        self.spectra_image.set_extent((first_lbd, last_lbd, last_id + 0.5, first_id - 0.5))
+        self.spectra_image.set_clim(*round_limits(np.nanmin(image), np.nanmax(image)))
+        if data['limits'] is None:
+            self.opto_ax.set_xlim(first_lbd, last_lbd)
+            self.opto_ax.set_ylim(last_id + 0.5, first_id - 0.5)
+        self.opto_ax.set_title(cycle)
+
+    def draw_spectra(self, data, cycle):
+        spectra, wavelength = data['spectra'], data['wavelength']
+        segments = np.empty(spectra.shape + (2,))
+        segments[:, :, 0] = wavelength
+        segments[:, :, 1] = spectra
+        self.spectra_lines.set_segments(segments)
+        self.opto_ax.set_title(cycle)
+        if data['limits'] is None:
+            autoscale(self.opto_ax, data_bounds(wavelength, spectra))
 
     def automatic_mode_on(self):
         self.refresh_button.state(["disabled"])
@@ -232,10 +331,64 @@ class OptoFrame(tkinter.Frame):
         if not filename:
             pass
         else:
-            self.parent.gui_model_q.put(("load opto csv", filename))
+            self.parent.gui_model_q.put(commands.LoadOptoCsv(filename))
             self.parent.initialdir = os.path.dirname(filename)
 
 
+def plot_size(ax, figure=None):
+    """
+    :return: (width, height) of the axes, or of the figure before the axes exist [pixels]
+    """
+    bbox = figure.bbox if ax is None else ax.bbox
+    return max(int(bbox.width), 2), max(int(bbox.height), 2)
+
+
+class ZoomWatcher:
+    def __init__(self, widget, send, delay=250):
+        """
+        sending visible axis limits after the user zoomed or panned with the toolbar, once they stop changing;
+        the model answers with data prepared for these limits
+        self.widget - tkinter widget scheduling the request
+        self.send - function taking [x min, x max, y min, y max]
+        self.delay - time without limit changes before sending [ms]
+        self.drawing - bool; set while data from the model is drawn, limits changed then are not sent
+        """
+        self.widget = widget
+        self.send = send
+        self.delay = delay
+        self.drawing = False
+        self.ax = None
+        self._job = None
+
+    def watch(self, ax):
+        self.ax = ax
+        ax.callbacks.connect('xlim_changed', self.limits_changed)
+        ax.callbacks.connect('ylim_changed', self.limits_changed)
+
+    def limits_changed(self, ax):
+        if self.drawing:
+            return
+        self.cancel()
+        self._job = self.widget.after(self.delay, self.request)
+
+    def cancel(self):
+        if self._job is not None:
+            self.widget.after_cancel(self._job)
+            self._job = None
+
+    def request(self):
+        self._job = None
+        self.send([float(limit) for limit in self.ax.get_xlim() + self.ax.get_ylim()])
+
+    @contextmanager
+    def drawing_data(self):
+        self.drawing = True
+        try:
+            yield
+        finally:
+            self.drawing = False
+
+
 class ParamFrame(tkinter.Frame):
     def __init__(self, root, *args, **kwargs):
         tkinter.Frame.__init__(self, root, *args, **kwargs)
@@ -243,6 +396,8 @@ class ParamFrame(tkinter.Frame):
         self.running_experiment = False
         self.start_stop_stringvar = tkinter.StringVar()
         self.dirname = None
+        # [levelname, message, text, count] of the last line in the log widget
+        self.last_log = None
         self.setup_frame()
         self.after(100, self.poll_log_queue)
 
@@ -257,12 +412,12 @@ class ParamFrame(tkinter.Frame):
     def automatic_mode_on(self):
         self.start_experiment_button.state(["!disabled"])
         self.browse_exp_button.state(["!disabled"])
-        self.cycle_buttons.automatic_mode_on()
+        self.cycle_navigator.automatic_mode_on()
 
     def automatic_mode_off(self):
         self.start_experiment_button.state(["disabled"])
         self.browse_exp_button.state(["disabled"])
-        self.cycle_buttons.automatic_mode_off()
+        self.cycle_navigator.automatic_mode_off()
 
     def setup_logger(self):
         self.logger_text = scrolledtext.ScrolledText(self, state='disabled', height=8, width=60)
@@ -279,19 +434,22 @@ class ParamFrame(tkinter.Frame):
         self.mode_radio = ttk.Radiobutton(self, command=self.set_automatic_mode, text="automatic mode")
         self.mode_radio.grid(row=2, column=0)
 
-        self.cycle_buttons = CycleButtonsGroup(self)
-        self.cycle_buttons.grid(row=0, columnspan=3)
+        self.cycle_navigator = CycleNavigator(self)
+        self.cycle_navigator.grid(row=0, columnspan=3)
 
         self.browse_exp_button = ttk.Button(self, text="Browse for experiment", command=self.askopenfile_exp)
         self.browse_exp_button.state(["disabled"])
         self.browse_exp_button.grid(row=2, column=1)
 
-        self.start_experiment_button = ttk.Button(self, text="start experiment", command=self.on_off_experiment)
+        self.start_stop_stringvar.set("start experiment")
+        self.start_experiment_button = ttk.Button(self, textvariable=self.start_stop_stringvar,
+                                                  command=self.on_off_experiment)
         self.start_experiment_button.state(["disabled"])
         self.start_experiment_button.grid(row=2, column=2)
 
     def all_done(self):
         self.running_experiment = False
+        self.start_stop_stringvar.set("start experiment")
         self.start_experiment_button.state(['!disabled'])
         self.browse_exp_button.state(['!disabled'])
         self.mode_radio.state(['!disabled'])
@@ -303,16 +461,26 @@ class ParamFrame(tkinter.Frame):
             logging.info("experiment started")
         elif not self.running_experiment and not self.dirname:
             logging.warning("no experiment directory")
+        else:
+            self.stop_experiment()
 
     def start_experiment(self):
-        # request list of cycles from CycleButtonsGroup
         # inform model to start experiment
         self.running_experiment = True
-        self.parent.gui_model_q.put(("start experiment", self.dirname))
-        self.start_experiment_button.state(['disabled'])
+        self.parent.gui_model_q.put(commands.StartExperiment(self.dirname))
+        self.start_stop_stringvar.set("stop experiment")
         self.browse_exp_button.state(['disabled'])
         self.mode_radio.state(['disabled'])
 
+    def stop_experiment(self):
+        # running experiment stops at its next checkpoint and the model answers with "all done";
+        # an experiment that hasn't started yet is just dropped
+        if self.parent.gui_model_q.cancel(commands.StartExperiment):
+            self.start_experiment_button.state(['disabled'])
+            logging.info("stopping experiment")
+        else:
+            self.all_done()
+
     def askopenfile_exp(self):
         self.dirname = filedialog.askdirectory(initialdir=self.parent.initialdir, title="Select directory")
         if not self.dirname:
@@ -320,123 +488,163 @@ class ParamFrame(tkinter.Frame):
         else:
             logging.info("experiment {}".format(self.dirname))
 
-    def display_log(self, record):
+    def display_logs(self, records, dropped=0):
+        """
+        showing a batch of records in one update of the log widget; repeated messages are collapsed into one line
+        with their count, and the widget keeps the last MAX_LOG_LINES lines
+        :param records: list of (levelname, message, formatted text) tuples
+        :param dropped: number of records lost before the batch
+        """
+        lines = []
+        if dropped:
+            lines.append(['WARNING', None, "{} log messages not shown, see the log file".format(dropped), 1])
+        for level, message, text in records:
+            if "\n" in text:
+                # multi-line records, e.g. with tracebacks, are not collapsed
+                message = None
+            previous = lines[-1] if lines else self.last_log
+            if previous is not None and previous[1] is not None and previous[:2] == [level, message]:
+                previous[3] += 1
+                if not lines:
+                    lines.append(previous)
+            else:
+                lines.append([level, message, text, 1])
+        if not lines:
+            return
         self.logger_text.configure(state='normal')
-        self.logger_text.insert(tkinter.END, record)
+        if lines[0] is self.last_log:
+            # the last line is written again with its new count
+            self.logger_text.delete('end-2l', 'end-1c')
+        chunks = []
+        for level, message, text, count in lines:
+            chunks += [text + ("" if count == 1 else " (repeated {} times)".format(count)) + "\n", level]
+        self.logger_text.insert(tkinter.END, *chunks)
+        excess = int(self.logger_text.index('end-1c').split('.')[0]) - 1 - MAX_LOG_LINES
+        if excess > 0:
+            self.logger_text.delete('1.0', '{}.0'.format(excess + 1))
         self.logger_text.configure(state='disabled')
         # Autoscroll to the bottom
         self.logger_text.yview(tkinter.END)
+        self.last_log = lines[-1]
 
     def poll_log_queue(self):
-        # Check every 100ms if there is a new message in the queue to display
-        while True:
-            record = self.parent.log_q.get()
-            if record is None:
-                break
-            else:
-                self.display_log(record)
+        # every 100ms all waiting messages are shown at once
+        records, dropped = self.parent.log_q.drain()
+        self.display_logs(records, dropped)
         self.after(100, self.poll_log_queue)
 
 
-class CycleButton(ttk.Button):
-    def __init__(self, parent, cycle):
-        """
-        :param parent: DuckFrame obj
-        :param cycle: int with cycle number
-        """
-        self.parent = parent
-        self.cycle = cycle
-        self.on = False
-        #########################
-        # self.style = ttk.Style()
-        # self.style.configure(style="cycle_{}.TButton".format(self.cycle))
-        # self.color_on = "#0000ff"
-        # self.color_off = "#000000"
-        #########################
-        button_text = "Cycle {}".format(self.cycle + 1)
-        ttk.Button.__init__(self, parent, text=button_text,
-                            style="cycle_{}.TButton".format(self.cycle),
-                            command=self.button_command)
-
-    # def change_button_color(self, color: str) -> None:
-    #     # configure the style with a background color
-    #     self.style.configure("cycle_{}.TButton".format(self.cycle), foreground=color)
-
-    def button_command(self):
-        if self.on:
-            self.button_off()
-        else:
-            self.button_on()
-
-    def button_on(self):
-        # self.change_button_color(self.color_on)
-        self.parent.button_on(self.cycle)
-        self.on = True
-
-    def button_off(self):
-        # self.change_button_color(self.color_off)
-        self.parent.button_off(self.cycle)
-        self.on = False
-
+class CycleNavigator(tkinter.Frame):
+    columns = ('measurements', 'V', 'I', 'spectra')
 
-class CycleButtonsGroup(tkinter.Frame):
     def __init__(self, root, *args, **kwargs):
+        """
+        list of all cycles with their summary statistics; selecting a cycle asks the model to load it
+        :param root: ParamFrame obj
+        self.summaries - list with dict of summary statistics for each cycle, sent by the model; rows of the list
+        are identified by position in self.summaries, names of cycles may repeat
+        self.current - name of the displayed cycle
+        """
         tkinter.Frame.__init__(self, root, *args, **kwargs)
         self.parent = root
-        self.no_cycles = 1
         self.automatic_mode = False
-        self.cycle_buttons_dict = {}
-        self.buttons_on = []
+        self.summaries = []
+        self.current = None
         self.setup_frame()
 
     def setup_frame(self):
-        for num in range(3):
-            cycle = CycleButton(self, cycle=num)
-            cycle.grid(row=0, column=num)
-            if num >= 1:
-                cycle.state(["disabled"])
-            self.cycle_buttons_dict[num] = cycle
-
-    def button_on(self, cycle):
-        if self.automatic_mode:
-            self.buttons_on.append(cycle)
-        else:
-            for item in self.buttons_on:
-                self.cycle_buttons_dict[item].button_off()
-            self.buttons_on = [cycle]
-            self.parent.parent.gui_model_q.put(("ec cycle", cycle))
+        # treeview draws only the visible rows, so hundreds of cycles cost as much as a few
+        self.cycle_list = ttk.Treeview(self, columns=self.columns, height=4, selectmode='browse')
+        self.cycle_list.heading('#0', text='cycle')
+        self.cycle_list.heading('measurements', text='meas.')
+        self.cycle_list.heading('V', text='U [V]')
+        self.cycle_list.heading('I', text='I [uA]')
+        self.cycle_list.heading('spectra', text='spectra')
+        self.cycle_list.column('#0', width=80)
+        for column, width in zip(self.columns, (60, 110, 150, 60)):
+            self.cycle_list.column(column, width=width, anchor='e')
+        scrollbar = ttk.Scrollbar(self, orient='vertical', command=self.cycle_list.yview)
+        self.cycle_list.configure(yscrollcommand=scrollbar.set)
+        self.cycle_list.bind('<<TreeviewSelect>>', self.on_select)
+
+        self.previous_button = ttk.Button(self, text="<", width=3, command=lambda: self.step(-1))
+        self.next_button = ttk.Button(self, text=">", width=3, command=lambda: self.step(1))
+
+        self.previous_button.grid(row=0, column=0, sticky='ns')
+        self.cycle_list.grid(row=0, column=1)
+        scrollbar.grid(row=0, column=2, sticky='ns')
+        self.next_button.grid(row=0, column=3, sticky='ns')
 
-    def button_off(self, cycle):
-        try:
-            self.buttons_on.remove(cycle)
-        except ValueError:
-            pass
+    @staticmethod
+    def format_range(value_range, fmt):
+        if value_range is None:
+            return "-"
+        return "{} .. {}".format(fmt.format(value_range[0]), fmt.format(value_range[1]))
+
+    def set_summaries(self, summaries):
+        """
+        :param summaries: list with dict of summary statistics for each cycle
+        """
+        self.summaries = summaries
+        self.cycle_list.delete(*self.cycle_list.get_children())
+        for position, summary in enumerate(summaries):
+            spectra = "-" if summary['spectra'] is None else summary['spectra']
+            values = (summary['measurements'],
+                      self.format_range(summary['V'], "{:.2f}"),
+                      self.format_range(summary['uA'], "{:.3g}"),
+                      spectra)
+            self.cycle_list.insert('', 'end', iid=str(position),
+                                   text=View.cycle_number_increment(summary['name']), values=values)
+        if self.row(self.current) is not None:
+            self.show_cycle(self.current)
+
+    def row(self, name):
+        """
+        :return: iid of the first row of cycle name, None if it isn't listed
+        """
+        for position, summary in enumerate(self.summaries):
+            if summary['name'] == name:
+                return str(position)
+        return None
 
-    def update_no_cycles(self, num_cycles):
-        # disable all buttons
-        for cycle_button in self.cycle_buttons_dict:
-            self.cycle_buttons_dict[cycle_button].state(["disabled"])
+    def name(self, row):
+        return self.summaries[int(row)]['name']
 
-        # enable valid buttons
-        if num_cycles > 0:
-            try:
-                for num in range(num_cycles):
-                    self.cycle_buttons_dict[num].state(["!disabled"])
-            except KeyError:
-                logging.warning(f"unrecognizable cycle number: {num_cycles}")
-        else:
-            self.cycle_buttons_dict[0].state(["!disabled"])
+    def show_cycle(self, name):
+        """
+        marking cycle drawn by the model, without sending an order
+        """
+        self.current = name
+        row = self.row(name)
+        if row is not None:
+            self.cycle_list.selection_set(row)
+            self.cycle_list.see(row)
+
+    def on_select(self, event=None):
+        selection = self.cycle_list.selection()
+        if self.automatic_mode or not selection or self.name(selection[0]) == self.current:
+            return
+        self.current = self.name(selection[0])
+        self.parent.parent.gui_model_q.put(commands.SelectEcCycle(self.current))
+
+    def step(self, direction):
+        cycles = self.cycle_list.get_children()
+        if self.automatic_mode or not cycles:
+            return
+        selection = self.cycle_list.selection() or (self.row(self.current),)
+        position = cycles.index(selection[0]) + direction if selection[0] in cycles else 0
+        self.cycle_list.selection_set(cycles[max(0, min(position, len(cycles) - 1))])
+        self.cycle_list.see(self.cycle_list.selection()[0])
 
     def automatic_mode_on(self):
         self.automatic_mode = True
-        for cycle_button in self.cycle_buttons_dict:
-            self.cycle_buttons_dict[cycle_button].state(["disabled"])
+        self.previous_button.state(["disabled"])
+        self.next_button.state(["disabled"])
 
     def automatic_mode_off(self):
         self.automatic_mode = False
-        for num in range(3):
-            self.cycle_buttons_dict[num].button_off()
-        self.update_no_cycles(self.no_cycles)
+        self.previous_button.state(["!disabled"])
+        self.next_button.state(["!disabled"])
 
 
 class AnalysisFrame(tkinter.Frame):
@@ -449,6 +657,10 @@ class AnalysisFrame(tkinter.Frame):
         canvas = FigureCanvasTkAgg(self.anls_figure, master=self)
         canvas.get_tk_widget().grid(row=1, columnspan=2)
         canvas.draw()
+        self.anls_updater = FigureUpdater(canvas)
+        self.plot_type = None
+        self.anls_axes = []
+        self.anls_lines = []
 
         self.anls_redraw_button = ttk.Button(self, text="Redraw", command=self.model_send_params)
         self.anls_savedata_button = ttk.Button(self, text="Save data", command=self.save_data)
@@ -473,52 +685,72 @@ class AnalysisFrame(tkinter.Frame):
 
     def save_data(self):
         logging.info("saving data to files")
-        self.parent.gui_model_q.put(("save data", 0))
+        self.parent.gui_model_q.put(commands.SaveData())
 
     def model_send_params(self):
         logging.info("collecting data for plotting")
         param = self.param_option_string.get()
-        self.parent.gui_model_q.put((param, 0))
+        self.parent.gui_model_q.put(Command.from_message((param, None)))
 
-    def parameter_teardown(self):
+    def parameter_teardown(self, plot_type):
+        """
+        rebuilding axes when another type of plot is drawn; plots of the same type reuse axes and lines
+        :param plot_type: order of the plotted parameter
+        """
         self.anls_figure.clf()
+        self.anls_updater.clear()
+        self.plot_type = plot_type
+        self.anls_axes = [self.anls_figure.add_subplot(111)]
+        self.anls_lines = []
 
     def two_parameter_plotting(self, ec_V, iodm, lbd_min, cycle):
-        self.parameter_teardown()
-        min_ax = self.anls_figure.add_subplot(111)
-        color = 'b'
-        min_ax.plot(ec_V, lbd_min, '.', color=color)
-        min_ax.set_xlabel('U [V]')
-        min_ax.set_ylabel('λ [nm]', color=color)
-        min_ax.set_title(cycle)
-
-        color = 'r'
-        iodm_ax = min_ax.twinx()
-        iodm_ax.plot(ec_V, iodm, '.', color=color)
-        iodm_ax.set_ylabel('IODM', color=color)
-
-        self.anls_figure.tight_layout()
-        self.anls_figure.canvas.draw()
+        if self.plot_type != 'fit λ(V)+IODM(V)':
+            self.parameter_teardown('fit λ(V)+IODM(V)')
+            min_ax = self.anls_axes[0]
+            color = 'b'
+            self.anls_lines.append(min_ax.plot([], [], '.', color=color)[0])
+            min_ax.set_xlabel('U [V]')
+            min_ax.set_ylabel('λ [nm]', color=color)
+
+            color = 'r'
+            iodm_ax = min_ax.twinx()
+            self.anls_axes.append(iodm_ax)
+            self.anls_lines.append(iodm_ax.plot([], [], '.', color=color)[0])
+            iodm_ax.set_ylabel('IODM', color=color)
+            self.anls_updater.animate(min_ax.title, *self.anls_lines)
+        self.update_lines([(ec_V, lbd_min), (ec_V, iodm)], cycle)
 
     def parameter_plotting(self, param, x, y, cycle):
-        self.parameter_teardown()
-        min_ax = self.anls_figure.add_subplot(111)
-        min_ax.plot(x, y, '.')
-        min_ax.set_title(cycle)
-        if param == 'fit λ(V)':
-            min_ax.set_xlabel('U [V]')
-            min_ax.set_ylabel('λ [nm]')
-        elif param == 'λ(meas)':
-            min_ax.set_xlabel('measurement [samples]')
-            min_ax.set_ylabel('λ [nm]')
-        elif param == 'IODM(V)':
-            min_ax.set_xlabel('U [V]')
-            min_ax.set_ylabel('IODM')
-        elif param == 'IODM(meas)':
-            min_ax.set_xlabel('measurement [samples]')
-            min_ax.set_ylabel('IODM')
-        self.anls_figure.tight_layout()
-        self.anls_figure.canvas.draw()
+        if self.plot_type != param:
+            self.parameter_teardown(param)
+            min_ax = self.anls_axes[0]
+            self.anls_lines.append(min_ax.plot([], [], '.')[0])
+            if param == 'fit λ(V)':
+                min_ax.set_xlabel('U [V]')
+                min_ax.set_ylabel('λ [nm]')
+            elif param == 'λ(meas)':
+                min_ax.set_xlabel('measurement [samples]')
+                min_ax.set_ylabel('λ [nm]')
+            elif param == 'IODM(V)':
+                min_ax.set_xlabel('U [V]')
+                min_ax.set_ylabel('IODM')
+            elif param == 'IODM(meas)':
+                min_ax.set_xlabel('measurement [samples]')
+                min_ax.set_ylabel('IODM')
+            self.anls_updater.animate(min_ax.title, *self.anls_lines)
+        self.update_lines([(x, y)], cycle)
+
+    def update_lines(self, data, cycle):
+        """
+        :param data: list of (x, y) for each line, in order of self.anls_lines
+        :param cycle: title of the plot
+        """
+        for line, (x, y) in zip(self.anls_lines, data):
+            line.set_data(x, y)
+        self.anls_axes[0].set_title(cycle)
+        for ax in self.anls_axes:
+            autoscale(ax)
+        self.anls_updater.redraw()
 
 
 class RoundedDoubleVar(tkinter.DoubleVar):
@@ -0,0 +1,280 @@
+import logging
+import threading
+import time
+
+INTERACTIVE = 0
+BATCH = 1
+LAST = 2
+
+_running = threading.local()
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def checkpoint():
+    """
+    cooperative cancellation point for long loops; does nothing outside of a command handler
+    :raise JobCancelled: if the command handled by the calling thread was cancelled
+    """
+    command = getattr(_running, 'command', None)
+    if command is not None and command.cancelled:
+        raise JobCancelled(command.order)
+
+
+class Command:
+    order = None
+    priority = INTERACTIVE
+    # pending command equal to a newly sent one is kept and the new one dropped
+    coalesce = False
+    # command types whose pending and running commands become obsolete when this command is sent
+    supersedes = ()
+
+    def __init__(self, data=None):
+        """
+        order sent to a CommandBus; subclasses name the order and carry its data
+        self.data - order specific payload
+        self.cancelled - bool; set to stop the command at its next checkpoint
+        """
+        self.data = data
+        self.cancelled = False
+
+    def __iter__(self):
+        # commands unpack like the (order, data) tuples they replace
+        return iter((self.order, self.data))
+
+    def __repr__(self):
+        return "{}({!r})".format(type(self).__name__, self.data)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.order == other.order and self.data == other.data
+
+    __hash__ = object.__hash__
+
+    def cancel(self):
+        self.cancelled = True
+
+    @staticmethod
+    def from_message(message):
+        """
+        :param message: Command, or (order, data) tuple
+        :return: Command of the type registered for the order, UnknownCommand if there is none
+        """
+        if isinstance(message, Command):
+            return message
+        order, data = message
+        command_type = COMMANDS.get(order)
+        if command_type is None:
+            return UnknownCommand(order, data)
+        return command_type(data)
+
+
+class UnknownCommand(Command):
+    def __init__(self, order, data=None):
+        Command.__init__(self, data)
+        self.order = order
+
+
+class Stop(Command):
+    order = "stop"
+    priority = LAST
+
+
+class StartExperiment(Command):
+    order = "start experiment"
+    priority = BATCH
+    coalesce = True
+
+
+class DrawOptoCycle(Command):
+    order = "draw opto cycle"
+    coalesce = True
+
+
+class FitLambda(Command):
+    order = "fit λ(V)"
+    coalesce = True
+
+
+class IodmV(Command):
+    order = "IODM(V)"
+    coalesce = True
+
+
+class FitLambdaIodm(Command):
+    order = "fit λ(V)+IODM(V)"
+    coalesce = True
+
+
+class SaveData(Command):
+    order = "save data"
+    coalesce = True
+
+
+class ZoomEc(Command):
+    order = "zoom ec"
+
+
+class ZoomOpto(Command):
+    order = "zoom opto"
+
+
+# a newer zoom makes the previous one obsolete
+ZoomEc.supersedes = (ZoomEc,)
+ZoomOpto.supersedes = (ZoomOpto,)
+
+REDRAWS = (DrawOptoCycle, FitLambda, IodmV, FitLambdaIodm, ZoomEc, ZoomOpto)
+
+
+class SelectEcCycle(Command):
+    order = "ec cycle"
+
+
+# only the last selected cycle is worth drawing
+SelectEcCycle.supersedes = REDRAWS + (SelectEcCycle,)
+
+
+class LoadEcCsv(Command):
+    order = "load ec csv"
+    coalesce = True
+    supersedes = REDRAWS + (SelectEcCycle,)
+
+
+class LoadOptoCsv(Command):
+    order = "load opto csv"
+    coalesce = True
+    supersedes = REDRAWS
+
+
+COMMANDS = {command_type.order: command_type for command_type in
+            [Stop, StartExperiment, LoadEcCsv, LoadOptoCsv, SelectEcCycle, DrawOptoCycle,
+             FitLambda, IodmV, FitLambdaIodm, SaveData, ZoomEc, ZoomOpto]}
+
+
+def log_timing(command, seconds):
+    logging.debug("{} handled in {:.3f} s".format(command.order, seconds))
+
+
+class JobScheduler:
+    def __init__(self):
+        """
+        queue of commands waiting for the model, used in place of a plain Queue between gui and model
+        self.pending - list of commands not started yet, in order of arrival
+        self.running - command currently handled by the model, None if idle
+        """
+        self.pending = []
+        self.running = None
+        self._condition = threading.Condition()
+
+    def put(self, message):
+        """
+        adding command to pending jobs; a duplicate of a pending coalescing command is dropped,
+        pending commands superseded by the new one are dropped and a superseded running command is cancelled
+        :param message: Command, or (order, data) tuple
+        """
+        command = Command.from_message(message)
+        with self._condition:
+            if command.supersedes:
+                self.drop(command.supersedes)
+            if command.coalesce and command in self.pending:
+                logging.debug("{} already pending".format(command.order))
+                return
+            self.pending.append(command)
+            self._condition.notify()
+
+    def get(self):
+        """
+        blocking until a command is pending
+        :return: first pending command of the highest priority
+        """
+        with self._condition:
+            while not self.pending:
+                self._condition.wait()
+            command = min(self.pending, key=lambda job: job.priority)
+            self.pending.remove(command)
+            self.running = command
+            return command
+
+    def task_done(self):
+        with self._condition:
+            self.running = None
+
+    def cancel(self, command_types=Command):
+        """
+        dropping pending commands and cancelling the running one
+        :param command_types: Command subclass or tuple of them, all commands by default
+        :return: bool; True if the running command was cancelled and its handler is still to stop
+        """
+        with self._condition:
+            return self.drop(command_types)
+
+    def drop(self, command_types):
+        kept = [job for job in self.pending if not isinstance(job, command_types)]
+        if len(kept) < len(self.pending):
+            logging.debug("dropped {} pending orders".format(len(self.pending) - len(kept)))
+        self.pending = kept
+        if isinstance(self.running, command_types):
+            self.running.cancel()
+            return True
+        return False
+
+    def empty(self):
+        with self._condition:
+            return not self.pending
+
+
+class CommandBus:
+    def __init__(self, queue):
+        """
+        dispatching commands from a queue to handlers registered by command type
+        self.queue - JobScheduler or Queue with Command objects or (order, data) tuples
+        self.handlers - dictionary; keys are Command subclasses, values are functions taking the command data
+        self.timing_hooks - list of functions called with (command, seconds) after each handled command
+        """
+        self.queue = queue
+        self.handlers = {}
+        self.timing_hooks = [log_timing]
+
+    def register(self, command_type, handler):
+        self.handlers[command_type] = handler
+
+    def add_timing_hook(self, hook):
+        self.timing_hooks.append(hook)
+
+    def put(self, command):
+        self.queue.put(command)
+
+    def dispatch(self, command):
+        command = Command.from_message(command)
+        handler = self.handlers.get(type(command))
+        if handler is None:
+            logging.info("unrecognizable order: {}".format(command.order))
+            return
+        start = time.perf_counter()
+        _running.command = command
+        try:
+            handler(command.data)
+        except JobCancelled:
+            logging.info("{} cancelled".format(command.order))
+        finally:
+            _running.command = None
+            seconds = time.perf_counter() - start
+            for hook in self.timing_hooks:
+                hook(command, seconds)
+
+    def run(self):
+        """
+        blocking dispatch loop; waits on the queue without polling and returns after a Stop command
+        """
+        while True:
+            command = Command.from_message(self.queue.get())
+            if isinstance(command, Stop):
+                return
+            try:
+                self.dispatch(command)
+            except Exception:
+                # a failed order is logged and the bus keeps serving the next ones
+                logging.exception("order failed: {}".format(command.order))
+            finally:
+                self.queue.task_done()
@@ -1,7 +1,6 @@
 import numpy as np
 import threading
 import logging
-from queue import Empty
 
 
 class Controller(threading.Thread):
@@ -20,17 +19,14 @@ class Controller(threading.Thread):
     def run(self):
         logging.info("controller running thread {}".format(threading.get_ident()))
         while True:
-            try:
-                record = self._gui_ctrl_q.get(block=False)
-            except Empty:
-                pass
+            # blocking get, the thread sleeps until there is an order
+            record = self._gui_ctrl_q.get()
+            if record[0] == "load db file":
+                self.connect_db(record[1])
+            elif record[0] == "draw opto":
+                self._ctrl_model_q.put(record)
             else:
-                if record[0] == "load db file":
-                    self.connect_db(record[1])
-                elif record[0] == "draw opto":
-                    self._ctrl_model_q.put(record)
-                else:
-                    logging.info("unrecognizable input from gui: {}".format(record))
+                logging.info("unrecognizable input from gui: {}".format(record))
 
     def connect_db(self, db_fpath):
         self._ctrl_model_q.put(('connect to db', db_fpath))
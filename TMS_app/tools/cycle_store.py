@@ -0,0 +1,129 @@
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import Future
+
+
+class OptoCycleStore(Mapping):
+    def __init__(self, cycles, load_cycle, prefetch=True, budget_mb=None):
+        """
+        mapping cycle -> OptoCycleDataset, loading cycles on first access;
+        accessing a cycle starts loading the next one in a background thread;
+        least recently used cycles are evicted when their spectra exceed the memory budget, and loaded again when used
+        self.cycles - dictionary; keys are cycles, values are [first, last] ec_ids of the cycle
+        self.loaded - OrderedDict with resident OptoCycleDatasets, least recently used first
+        self.prefetch_next - bool; load next cycle in the background
+        self.budget - memory budget for spectra of resident cycles [bytes], None for no limit
+        self.resident_bytes - size of spectra of resident cycles [bytes]
+        self.evictions, self.reloads - numbers of evicted cycles and of cycles loaded again after eviction
+        """
+        self.cycles = dict(cycles)
+        self.loaded = OrderedDict()
+        self.prefetch_next = prefetch
+        self.budget = None if budget_mb is None else int(budget_mb * 2 ** 20)
+        self.resident_bytes = 0
+        self.evictions = 0
+        self.reloads = 0
+        self._evicted = set()
+        self._last_used = None
+        self._over_budget_logged = False
+        self._load_cycle = load_cycle
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, cycle):
+        if cycle not in self.cycles:
+            raise KeyError(cycle)
+        with self._lock:
+            self._last_used = cycle
+            dataset = self.loaded.get(cycle)
+            if dataset is not None:
+                self.loaded.move_to_end(cycle)
+        if dataset is None:
+            future, owner = self.request(cycle)
+            if owner:
+                self.fill(cycle, future)
+            dataset = future.result()
+        if self.prefetch_next:
+            self.prefetch(self.next_cycle(cycle))
+        return dataset
+
+    def __iter__(self):
+        return iter(self.cycles)
+
+    def __len__(self):
+        return len(self.cycles)
+
+    def next_cycle(self, cycle):
+        cycles = list(self.cycles)
+        position = cycles.index(cycle) + 1
+        return cycles[position] if position < len(cycles) else None
+
+    def request(self, cycle):
+        """
+        :return: (Future with the cycle's dataset, True if the caller has to load it)
+        """
+        with self._lock:
+            if cycle in self.loaded:
+                future = Future()
+                future.set_result(self.loaded[cycle])
+                return future, False
+            if cycle in self._pending:
+                return self._pending[cycle], False
+            future = self._pending[cycle] = Future()
+            return future, True
+
+    def fill(self, cycle, future):
+        try:
+            dataset = self._load_cycle(cycle)
+        except BaseException as e:
+            with self._lock:
+                del self._pending[cycle]
+            future.set_exception(e)
+            return
+        with self._lock:
+            self.loaded[cycle] = dataset
+            del self._pending[cycle]
+            self.resident_bytes += self.dataset_bytes(dataset)
+            if cycle in self._evicted:
+                self._evicted.discard(cycle)
+                self.reloads += 1
+            self.evict(keep=cycle)
+        future.set_result(dataset)
+
+    @staticmethod
+    def dataset_bytes(dataset):
+        return dataset.transmission.nbytes
+
+    def evict(self, keep):
+        """
+        dropping least recently used cycles until resident spectra fit the budget;
+        the newest cycle and the last used one are kept
+        :param keep: cycle that was just loaded
+        """
+        if self.budget is None or self.resident_bytes <= self.budget:
+            return
+        protected = {keep, self._last_used}
+        for cycle in [cycle for cycle in self.loaded if cycle not in protected]:
+            if self.resident_bytes <= self.budget:
+                break
+            dataset = self.loaded.pop(cycle)
+            self.resident_bytes -= self.dataset_bytes(dataset)
+            self._evicted.add(cycle)
+            self.evictions += 1
+            logging.info("evicted {} from memory; {} cycles resident, {:.1f} of {:.0f} MB "
+                         "({} evictions, {} reloads)".format(cycle, len(self.loaded), self.resident_bytes / 2 ** 20,
+                                                            self.budget / 2 ** 20, self.evictions, self.reloads))
+        if self.resident_bytes > self.budget and not self._over_budget_logged:
+            self._over_budget_logged = True
+            logging.warning("optical cycles in use exceed memory budget: {:.1f} of {:.0f} MB".format(
+                self.resident_bytes / 2 ** 20, self.budget / 2 ** 20))
+
+    def prefetch(self, cycle):
+        if cycle is None:
+            return
+        future, owner = self.request(cycle)
+        if owner:
+            logging.debug("prefetching {}".format(cycle))
+            threading.Thread(target=self.fill, args=(cycle, future), daemon=True).start()
@@ -0,0 +1,266 @@
+import numpy as np
+
+
+def bin_edges(length, bins):
+    """
+    :return: int array with first index of each of bins nearly equal bins covering length entries
+    """
+    return np.linspace(0, length, bins + 1).astype(np.intp)[:-1]
+
+
+def minmax_reduce(array, size, axis=0):
+    """
+    shrinking an axis of array to at most size entries, keeping minimum and maximum of each bin of entries;
+    every bin gives two entries, minimum first; NaN values are ignored unless a bin has only NaN
+    :param array: numpy array
+    :param size: maximal length of the axis after reduction, at least 2
+    :param axis: reduced axis
+    :return: (reduced array, index of the first entry of the bin of each output entry); array itself if it fits size
+    """
+    array = np.asarray(array)
+    length = array.shape[axis]
+    if length <= size:
+        return array, np.arange(length)
+    bins = max(size // 2, 1)
+    starts = bin_edges(length, bins)
+    minima = np.fmin.reduceat(array, starts, axis=axis)
+    maxima = np.fmax.reduceat(array, starts, axis=axis)
+    reduced = np.stack([minima, maxima], axis=axis + 1)
+    shape = list(array.shape)
+    shape[axis] = 2 * bins
+    return reduced.reshape(shape), np.repeat(starts, 2)
+
+
+def mean_reduce(values, starts, weights=None):
+    """
+    means of bins of rows of a 2D array, ignoring NaN
+    :param values: 2D array
+    :param starts: index of the first row of each bin
+    :param weights: 1D array with number of values each row stands for, e.g. for rows of block means; 1 if None
+    :return: 2D float array with one row per bin; NaN for bins of NaN only
+    """
+    if weights is None:
+        sums = np.add.reduceat(values, starts, axis=0, dtype=float)
+        if not np.isnan(sums).any():
+            return sums / np.diff(np.append(starts, values.shape[0]))[:, np.newaxis]
+        weights = np.ones(values.shape[0])
+    weights = np.asarray(weights, dtype=float)[:, np.newaxis]
+    finite = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(finite, values * weights, 0.0), starts, axis=0)
+    counts = np.add.reduceat(np.where(finite, weights, 0.0), starts, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts
+
+
+def extremes_image(minima, maxima, means, height, width, weights=None):
+    """
+    downsampling a summarized 2D array to at most height x width pixels, one value per pixel: the extreme of its bin
+    lying farther from the bin mean, so that peaks and dips stay visible and a smooth array stays smooth
+    :param minima, maxima, means: 2D arrays of equal shape with minimum, maximum and mean of the summarized values
+    :param height: maximal number of image rows
+    :param width: maximal number of image columns
+    :param weights: 1D array with number of values summarized by each row, 1 if None
+    :return: (2D array, index of the first row of each image row, index of the first column of each image column)
+    """
+    if not minima.size:
+        return minima, np.arange(minima.shape[0]), np.arange(minima.shape[1])
+    rows = bin_edges(minima.shape[0], min(height, minima.shape[0]))
+    columns = bin_edges(minima.shape[1], min(width, minima.shape[1]))
+    low = np.fmin.reduceat(np.fmin.reduceat(minima, rows, axis=0), columns, axis=1)
+    high = np.fmax.reduceat(np.fmax.reduceat(maxima, rows, axis=0), columns, axis=1)
+    mean = mean_reduce(mean_reduce(means, rows, weights).T, columns).T
+    return np.where(high - mean >= mean - low, high, low), rows, columns
+
+
+def minmax_image(matrix, height, width):
+    """
+    downsampling a 2D array to at most height x width pixels, keeping extremes of binned rows and columns
+    :return: (2D array, index of the first row of each image row, index of the first column of each image column)
+    """
+    matrix = np.asarray(matrix)
+    return extremes_image(matrix, matrix, matrix, height, width)
+
+
+def minmax_indices(values, size):
+    """
+    indices of at most size points keeping the shape of a trace: first minimum and first maximum of each bin of values,
+    in order; NaN values are ignored
+    :param values: 1D array
+    :param size: maximal number of indices, at least 2
+    :return: sorted int array of indices, all indices if values fit size
+    """
+    values = np.asarray(values, dtype=float)
+    length = values.shape[0]
+    if length <= size:
+        return np.arange(length)
+    bins = max(size // 2, 1)
+    starts = bin_edges(length, bins)
+    bin_of = np.repeat(np.arange(bins), np.diff(np.append(starts, length)))
+    picked = []
+    for extreme in (np.fmin, np.fmax):
+        hits = np.flatnonzero(values == extreme.reduceat(values, starts)[bin_of])
+        picked.append(hits[np.unique(bin_of[hits], return_index=True)[1]])
+    return np.unique(np.concatenate(picked))
+
+
+class TracePyramid:
+    def __init__(self, x, y, base=3):
+        """
+        multi-resolution min/max summary of a trace of points (x[i], y[i]), e.g. a cyclic voltammogram, for drawing
+        any part of it at any zoom in time proportional to the number of drawn points;
+        a block of consecutive points is described by the indices of its points of minimal and maximal x and y,
+        which give both its bounding box and the points kept when it is drawn
+        self.x, self.y - 1D float arrays with the trace
+        self.base - rows of self.levels[0] describe blocks of 2**base points
+        self.levels - list of int arrays of shape (blocks, 4) with indices of min x, max x, min y, max y of each block;
+        blocks of self.levels[i + 1] merge pairs of blocks of self.levels[i], the last level has a single block
+        """
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.base = base
+        self.levels = []
+        length = self.x.shape[0]
+        if not length:
+            return
+        block = 2 ** base
+        blocks = -(-length // block)
+        columns = []
+        for values in (self.x, self.y):
+            padded = np.full(blocks * block, np.nan)
+            padded[:length] = values
+            padded = padded.reshape(blocks, block)
+            nan = np.isnan(padded)
+            columns.append(np.argmin(np.where(nan, np.inf, padded), axis=1))
+            columns.append(np.argmax(np.where(nan, -np.inf, padded), axis=1))
+        level = np.stack(columns, axis=1) + np.arange(0, length, block)[:, np.newaxis]
+        # blocks of NaN only point at padding
+        level = np.minimum(level, length - 1).astype(np.int32 if length < 2 ** 31 else np.int64)
+        self.levels.append(level)
+        while level.shape[0] > 1:
+            level = self.merge(level)
+            self.levels.append(level)
+
+    @property
+    def nbytes(self):
+        return self.x.nbytes + self.y.nbytes + sum(level.nbytes for level in self.levels)
+
+    def merge(self, level):
+        first = level[0::2]
+        second = level[1::2]
+        if second.shape[0] < first.shape[0]:
+            second = np.concatenate([second, first[-1:]])
+        merged = np.empty_like(first)
+        for column, (values, smaller) in enumerate([(self.x, True), (self.x, False), (self.y, True), (self.y, False)]):
+            a, b = values[first[:, column]], values[second[:, column]]
+            take_second = (b < a if smaller else b > a) | np.isnan(a)
+            merged[:, column] = np.where(take_second, second[:, column], first[:, column])
+        return merged
+
+    def visible(self, level_number, blocks, xlim=None, ylim=None):
+        """
+        :return: blocks of the level whose bounding boxes overlap xlim x ylim
+        """
+        extremes = self.levels[level_number][blocks]
+        keep = np.ones(blocks.shape, dtype=bool)
+        for limits, values, low, high in ((xlim, self.x, 0, 1), (ylim, self.y, 2, 3)):
+            if limits is not None:
+                keep &= (values[extremes[:, low]] <= max(limits)) & (values[extremes[:, high]] >= min(limits))
+        return blocks[keep]
+
+    def query(self, size, xlim=None, ylim=None):
+        """
+        points drawing the part of the trace within xlim and ylim; coarse blocks outside the limits are skipped
+        without looking at their points, so the time depends on size rather than on the length of the trace
+        :param size: maximal number of points
+        :param xlim, ylim: (low, high) visible ranges, None for the whole range
+        :return: int array of point indices in trace order; -1 marks gaps between parts of the trace
+        """
+        if not self.levels:
+            return np.empty(0, dtype=np.intp)
+        level_number = len(self.levels) - 1
+        blocks = self.visible(level_number, np.arange(self.levels[level_number].shape[0]), xlim, ylim)
+        # refining while the children still fit size; each block is drawn with its 4 extreme points
+        while level_number > 0 and 8 * blocks.shape[0] <= size:
+            level_number -= 1
+            children = (2 * blocks[:, np.newaxis] + np.arange(2)).ravel()
+            children = children[children < self.levels[level_number].shape[0]]
+            blocks = self.visible(level_number, children, xlim, ylim)
+        block = 2 ** self.base
+        if level_number == 0 and block * blocks.shape[0] <= size:
+            points = (blocks[:, np.newaxis] * block + np.arange(block)).ravel()
+            points = points[points < self.x.shape[0]]
+            block_of = points // block
+        else:
+            points = np.sort(self.levels[level_number][blocks], axis=1).ravel()
+            block_of = np.repeat(blocks, 4)
+            distinct = np.ones(points.shape, dtype=bool)
+            distinct[1:] = points[1:] != points[:-1]
+            points, block_of = points[distinct], block_of[distinct]
+        gaps = np.flatnonzero(np.diff(block_of) > 1) + 1
+        return np.insert(points.astype(np.intp), gaps, -1)
+
+    def points(self, indices):
+        """
+        :param indices: result of query
+        :return: (x, y) arrays of the points, NaN at gaps
+        """
+        gaps = indices < 0
+        x, y = self.x[indices], self.y[indices]
+        x[gaps] = np.nan
+        y[gaps] = np.nan
+        return x, y
+
+
+class SpectraPyramid:
+    def __init__(self, matrix, base=4):
+        """
+        multi-resolution min/max summary of the rows of a spectra matrix, for images of any range of spectra in time
+        proportional to the image size
+        self.matrix - 2D array, one spectrum per row
+        self.base - rows of self.levels[0] summarize blocks of 2**base spectra
+        self.levels - list of (minima, maxima, means, sizes): 2D arrays with minimum, maximum and mean of each block
+        and 1D array with number of spectra in each block; each level halves the rows of the previous one
+        """
+        self.matrix = np.asarray(matrix)
+        self.base = base
+        self.levels = []
+        rows = self.matrix.shape[0]
+        if rows <= 2 ** base:
+            return
+        starts = np.arange(0, rows, 2 ** base)
+        level = (np.fmin.reduceat(self.matrix, starts, axis=0), np.fmax.reduceat(self.matrix, starts, axis=0),
+                 mean_reduce(self.matrix, starts), np.diff(np.append(starts, rows)))
+        self.levels.append(level)
+        while level[0].shape[0] > 1:
+            minima, maxima, means, sizes = level
+            starts = np.arange(0, minima.shape[0], 2)
+            level = (np.fmin.reduceat(minima, starts, axis=0), np.fmax.reduceat(maxima, starts, axis=0),
+                     mean_reduce(means, starts, sizes), np.add.reduceat(sizes, starts))
+            self.levels.append(level)
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for level in self.levels for values in level)
+
+    def query(self, rows, columns, height, width):
+        """
+        image of a part of the matrix of at most height x width pixels, keeping extremes of binned values
+        :param rows: (first, stop) range of rows
+        :param columns: (first, stop) range of columns
+        :param height: maximal number of image rows
+        :param width: maximal number of image columns
+        :return: (2D array, (first, stop) rows covered by the image)
+        """
+        first, stop = rows
+        columns = slice(*columns)
+        # coarsest level with at least height blocks in range
+        level_number = int(np.floor(np.log2(max((stop - first) / height, 1)))) - self.base
+        if level_number < 0 or not self.levels:
+            return minmax_image(self.matrix[first:stop, columns], height, width)[0], (first, stop)
+        level_number = min(level_number, len(self.levels) - 1)
+        block = 2 ** (self.base + level_number)
+        first_block, stop_block = first // block, -(-stop // block)
+        minima, maxima, means, sizes = self.levels[level_number]
+        minima, maxima, means = (values[first_block:stop_block, columns] for values in (minima, maxima, means))
+        first, stop = first_block * block, min(stop_block * block, self.matrix.shape[0])
+        return extremes_image(minima, maxima, means, height, width, sizes[first_block:stop_block])[0], (first, stop)
@@ -1,5 +1,6 @@
 import logging
 import numpy as np
+from TMS_app.tools.readers import parse_ec_csv
 
 significant_points = ['Umax', 'Umin', 'Umid1', 'Umid2']
 
@@ -20,42 +21,15 @@ class ElectroChemSet:
         self.cycles = {}
         self.id_dict = dict.fromkeys(significant_points)
 
-    def update_cycles_dict(self, tmp_cycle, num, cycles_count):
-        row_number = num - cycles_count
-        prev_key = next(iter(tmp_cycle))
-        start_prev = tmp_cycle[prev_key]
-        self.cycles[prev_key] = [start_prev, row_number - 1]
-
     def insert_ec_data(self, filename):
-        data = open(filename)
-        cycles_count = 0
-        tmp_cycle = {}
-        V, uA = [], []
-        for num, row in enumerate(data):
-            try:
-                tmp_v, tmp_ua = row.split(', ')
-                V.append(float(tmp_v))
-                uA.append(float(tmp_ua))
-            except ValueError:
-                if row.startswith('Cycle'):
-                    key = row.split(', ')[0]
-                    row_number = num - cycles_count
-                    if tmp_cycle:
-                        self.update_cycles_dict(tmp_cycle, num, cycles_count)
-                        tmp_cycle = {}
-                    tmp_cycle[key] = row_number
-                    cycles_count = cycles_count + 1
-                else:
-                    logging.warning("this doesn't seem like the right type of file")
-                    return False
-        if tmp_cycle:
-            self.update_cycles_dict(tmp_cycle, num, cycles_count)
-        else:
-            self.cycles['Cycle 0'] = [0, num]
-
-        self.V = V
-        self.uA = uA
-        self.id = range(len(V))
+        ec_data = parse_ec_csv(filename)
+        if ec_data is None:
+            return False
+        store = ElectroChemStore.from_arrays(ec_data)
+        self.cycles = {name: [int(x) for x in store.ids[num]] for num, name in enumerate(store.names)}
+        self.V = store.V
+        self.uA = store.uA
+        self.id = range(len(store.V))
         return True
 
     def insert_ec_csv(self, ec_data):
@@ -84,6 +58,68 @@ class ElectroChemSet:
                     self.id_dict[id_key][num] = len(self.V) + item
 
 
+class ElectroChemStore:
+    def __init__(self, V, uA, offsets, names, ids):
+        """
+        columnar storage of all cycles of an ec file
+        self.V - float64 array with potential of all measurements, NaN for missing data
+        self.uA - float64 array with current of all measurements, NaN for missing data
+        self.offsets - int array; measurements of cycle k are V[offsets[k]:offsets[k+1]]
+        self.names - list with cycle names
+        self.ids - int array with [first, last] measurement ids of each cycle
+        """
+        self.V = V
+        self.uA = uA
+        self.offsets = offsets
+        self.names = names
+        self.ids = ids
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays['V'], arrays['uA'], arrays['offsets'], [str(name) for name in arrays['names']],
+                   arrays['ids'])
+
+    def __len__(self):
+        return len(self.names)
+
+    def cycle(self, num):
+        """
+        :param num: position of cycle in file
+        :return: ElectroChemCycle with zero-copy views of V and uA
+        """
+        start, stop = self.offsets[num], self.offsets[num + 1]
+        first_meas_id, last_meas_id = (int(x) for x in self.ids[num])
+        return ElectroChemCycle(self.names[num], V=self.V[start:stop], uA=self.uA[start:stop],
+                                id=[first_meas_id, last_meas_id])
+
+    def cycles(self):
+        """
+        :return: dictionary; keys are cycle names, values are ElectroChemCycles
+        """
+        return {name: self.cycle(num) for num, name in enumerate(self.names)}
+
+    def summaries(self):
+        """
+        :return: list with dict of summary statistics for each cycle: name, ids, number of measurements,
+        V and uA ranges (None for cycles without valid data)
+        """
+        summaries = []
+        for num, name in enumerate(self.names):
+            start, stop = self.offsets[num], self.offsets[num + 1]
+            V, uA = self.V[start:stop], self.uA[start:stop]
+            valid = np.isfinite(V) & np.isfinite(uA)
+            summary = {'name': name,
+                       'ids': [int(x) for x in self.ids[num]],
+                       'measurements': int(stop - start),
+                       'V': None,
+                       'uA': None}
+            if valid.any():
+                summary['V'] = [float(V[valid].min()), float(V[valid].max())]
+                summary['uA'] = [float(uA[valid].min()), float(uA[valid].max())]
+            summaries.append(summary)
+        return summaries
+
+
 class ElectroChemCycle(ElectroChemSet):
 
     def __init__(self, cycle, **kwargs):
@@ -0,0 +1,37 @@
+import numpy as np
+
+
+class QuadraticFit:
+    def __init__(self, x_data):
+        """
+        least-squares fit of a*x + b*x**2 + c, solved for many spectra at once
+        self.x_data - 1D array with wavelengths of the fit range
+        self.design - design matrix of the fit; x is centered and scaled to keep it well conditioned
+        self.pinv - pseudo-inverse of self.design, calculated once per fit range
+        """
+        self.x_data = np.asarray(x_data, dtype=float)
+        if self.x_data.shape[0] == 0:
+            raise ValueError("empty fit range")
+        center = self.x_data.mean()
+        scale = np.abs(self.x_data - center).max() or 1.0
+        x = (self.x_data - center) / scale
+        self.design = np.column_stack([x, x ** 2, np.ones_like(x)])
+        self.pinv = np.linalg.pinv(self.design)
+
+    def matches(self, x_data):
+        return np.array_equal(self.x_data, x_data)
+
+    def fit(self, y_block):
+        """
+        :param y_block: 2D array, one spectrum cut to the fit range per row
+        :return: 2D array with fitted curves
+        """
+        coefficients = np.asarray(y_block, dtype=float) @ self.pinv.T
+        return coefficients @ self.design.T
+
+    def argmin(self, y_block):
+        """
+        :param y_block: 2D array, one spectrum cut to the fit range per row
+        :return: index of the fitted curve minimum for every row
+        """
+        return np.argmin(self.fit(y_block), axis=1)
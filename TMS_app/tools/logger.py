@@ -1,30 +1,55 @@
 import logging
 import queue
+import threading
+from collections import deque
 from os import makedirs
 from logging.handlers import QueueHandler, QueueListener
 from datetime import datetime
 
 
 class LogQueue(object):
-    def __init__(self):
-        self.logs = queue.Queue()
+    def __init__(self, maxlen=10000):
+        """
+        bounded buffer of log records waiting for the gui; when the gui falls behind the oldest records are dropped,
+        the log file keeps all of them
+        self.logs - deque with (levelname, message, formatted text) tuples
+        self.dropped - number of records dropped since the last drain
+        """
+        self.logs = deque(maxlen=maxlen)
+        self.dropped = 0
+        self._lock = threading.Lock()
 
-    def write(self, string):
-        self.logs.put(string)
+    def put(self, record):
+        with self._lock:
+            if len(self.logs) == self.logs.maxlen:
+                self.dropped += 1
+            self.logs.append(record)
 
-    def flush(self):
-        pass
+    def drain(self):
+        """
+        :return: (list of all waiting records in order of arrival, number of records dropped before them)
+        """
+        with self._lock:
+            records = list(self.logs)
+            self.logs.clear()
+            dropped, self.dropped = self.dropped, 0
+        return records, dropped
 
-    def get(self):
-        try:
-            msg = self.logs.get(block=False)
-        except queue.Empty:
-            return None
-        else:
-            return msg
 
-    def __str__(self):
-        return self.logs
+class GuiLogHandler(logging.Handler):
+    def __init__(self, log_queue):
+        """
+        handler passing records to the gui through a LogQueue
+        self.log_queue - LogQueue read by the gui
+        """
+        logging.Handler.__init__(self)
+        self.log_queue = log_queue
+
+    def emit(self, record):
+        try:
+            self.log_queue.put((record.levelname, record.getMessage(), self.format(record)))
+        except Exception:
+            self.handleError(record)
 
 
 def logger_setup():
@@ -33,7 +58,9 @@ def logger_setup():
     # formatter = logging.Formatter('%(asctime)s: %(threadName)s: %(message)s')
     formatter = logging.Formatter('%(asctime)s: %(message)s')
     # logging.basicConfig(stream=gui_log_queue, level=logging.INFO, format='%(asctime)s: %(threadName)s: %(message)s')
-    logging.basicConfig(stream=gui_log_queue, level=logging.INFO, format='%(asctime)s: %(message)s')
+    gui_handler = GuiLogHandler(gui_log_queue)
+    gui_handler.setFormatter(formatter)
+    logging.basicConfig(handlers=[gui_handler], level=logging.INFO)
     logger = logging.getLogger()
 
     log_queue = queue.Queue()
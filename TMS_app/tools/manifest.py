@@ -0,0 +1,83 @@
+import json
+import logging
+import os
+from TMS_app.tools.parse_cache import file_fingerprint
+
+MANIFEST_NAME = ".tms_manifest.json"
+MANIFEST_VERSION = 1
+
+
+class ExperimentManifest:
+    def __init__(self, root):
+        """
+        record of analysed experiment directories, kept as json file in the experiment root
+        self.root - string path to experiment directory
+        self.path - string path to manifest file
+        self.iodm_range - list with iodm range shared by all directories of the experiment
+        self.entries - dictionary; keys are directories relative to root, values are dicts with
+        input file fingerprints, analysis parameters and produced output files
+        """
+        self.root = os.path.abspath(root)
+        self.path = os.path.join(self.root, MANIFEST_NAME)
+        self.iodm_range = None
+        self.entries = {}
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path) as manifest_file:
+                manifest = json.load(manifest_file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            logging.warning("experiment manifest unreadable, analysing all directories")
+            return
+        if manifest.get('version') != MANIFEST_VERSION:
+            return
+        self.iodm_range = manifest.get('iodm_range')
+        self.entries = manifest.get('entries', {})
+
+    def save(self):
+        manifest = {'version': MANIFEST_VERSION,
+                    'iodm_range': self.iodm_range,
+                    'entries': self.entries}
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, 'w') as manifest_file:
+                json.dump(manifest, manifest_file, indent=1)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            logging.warning("unable to save experiment manifest")
+
+    def key(self, dir):
+        return os.path.relpath(os.path.abspath(dir), self.root)
+
+    @staticmethod
+    def inputs(ec_file, opto_file):
+        return {'ec': file_fingerprint(ec_file), 'opto': file_fingerprint(opto_file)}
+
+    def is_up_to_date(self, dir, ec_file, opto_file, params):
+        """
+        :return: True if directory was analysed from the same inputs with the same parameters
+        and all its output files still exist
+        """
+        entry = self.entries.get(self.key(dir))
+        if entry is None or entry['params'] != params:
+            return False
+        try:
+            if entry['inputs'] != self.inputs(ec_file, opto_file):
+                return False
+        except OSError:
+            return False
+        return all(os.path.exists(os.path.join(dir, output)) for output in entry['outputs'])
+
+    def record(self, dir, ec_file, opto_file, params, outputs):
+        """
+        saving analysis of a directory; the manifest is written after every directory,
+        so an interrupted experiment resumes from the first directory not recorded
+        """
+        self.entries[self.key(dir)] = {'inputs': self.inputs(ec_file, opto_file),
+                                       'params': params,
+                                       'outputs': [os.path.relpath(output, dir) for output in outputs]}
+        self.iodm_range = params['iodm_range']
+        self.save()
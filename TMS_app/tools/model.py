@@ -1,11 +1,31 @@
 #!/usr/bin/env python
 import threading
 import logging
-from TMS_app.tools.ec_dataset import ElectroChemSet, ElectroChemCycle
-from queue import Empty
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from TMS_app.tools import commands
+from TMS_app.tools.commands import CommandBus, JobCancelled, checkpoint
+from TMS_app.tools.decimation import TracePyramid, minmax_indices
+from TMS_app.tools.ec_dataset import ElectroChemStore
+from TMS_app.tools.manifest import ExperimentManifest
+from queue import Queue
 from TMS_app.tools.opto_dataset import OptoCycleDataset
+from TMS_app.tools.parse_cache import cached_parse, file_fingerprint
+from TMS_app.tools.payloads import payload
+from TMS_app.tools.profiling import Profiler
+from TMS_app.tools.results import CycleResults, ResultCache
+from TMS_app.tools.readers import OptoParseError, line_offsets, parse_ec_csv, read_opto_pixels, read_opto_rows
+from TMS_app.tools.cycle_store import OptoCycleStore
+from TMS_app.tools.spectra import SpectraMatrix
 import numpy as np
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+# bumped whenever a change of the analysis makes previously saved results outdated
+ANALYSIS_VERSION = 1
 
 
 class Model(threading.Thread):
@@ -13,66 +33,145 @@ class Model(threading.Thread):
     def __init__(self, **kwargs):
         """
         self.filename - string with full path to file
-        self.opto_cycles - dictionary with optical data cycles (max 3 cycles)
+        self.opto_cycles - OptoCycleStore mapping cycles to optical data, loaded cycle by cycle
         self.ec_cycles - dictionary with ec data cycles (max 3 cycles)
+        self.ec_store - ElectroChemStore with columns of the whole ec file; ec_cycles are views into it
         self.ec_dataset - ElectroChemSet - TO REMOVE
         self.cycles - dictionary; keys are cycles, values are ranges of ec measurements indices
         self.current_cycle - string; self.opto_cycles key pointing to current cycle
         self.iodm_range - list with first and last wavelength of iodm range
         self.iodm_window_size - approximate size of iodm wavelength window
+        self.use_parse_cache - bool; keep parsed files in sidecar .npy caches
+        self.prefetch - bool; load next optical cycle in the background
+        self.opto_memory_mb - memory budget for spectra of loaded optical cycles [MB], None for no limit
+        self.workers - number of processes analysing experiment directories, also threads smoothing the spectra of
+        a cycle analysed in this process
+        self.incremental - bool; skip experiment directories already analysed with unchanged inputs and parameters
+        self.bus - CommandBus dispatching orders from gui to model handlers
+        self.results - CycleResults with fit λ and IODM of all analysed cycles of the loaded files
+        self.boundaries - ResultCache with boundary spectra of recently analysed cycles
+        self.ec_fingerprint, self.opto_fingerprint - tuples identifying content of the loaded files
+        self.output_root - directory mirroring the experiment tree for saved files, None to save next to input files
+        self.output_dir - directory for saved files of the loaded optical file, None to save next to it
+        self.experiment_root - string path to directory of the running experiment
+        self.timings - dictionary; keys are analysis stages, values are seconds spent in them by the last experiment
+        self.plot_size - (width, height) of gui plots [pixels]; data sent for plotting is decimated to it
+        self.opto_view - 'spectra' or 'heatmap', kind of optical plot sent to the gui
+        self.ec_pyramids - ResultCache with TracePyramids of recently drawn ec cycles
+        self.send_plots - bool; send plot data of analysed cycles, off when no gui is attached, e.g. in batch runs
+        self.profiler - Profiler with spans of analysis stages per file and cycle, disabled unless profile is given
+        self.profile_path - file the profile of each experiment is exported to, None to only log its summary
         """
         threading.Thread.__init__(self)
         self.daemon = True
         self.filename = None
         self.opto_cycles = None
         self.ec_cycles = {}
+        self.ec_store = None
         self.current_cycle = None
         self.data_saving = None
 
         self.iodm_range = None  # nm
         self.iodm_window_size = 100  # nm
+        self.use_parse_cache = True
+        self.prefetch = kwargs.get('prefetch', True)
+        self.opto_memory_mb = kwargs.get('opto_memory_mb', 1024)
+        self.workers = kwargs.get('workers', 1)
+        self.incremental = kwargs.get('incremental', True)
+        self.results = CycleResults()
+        self.boundaries = ResultCache(maxsize=32)
+        self.ec_fingerprint = None
+        self.opto_fingerprint = None
+        self.output_root = kwargs.get('output_root')
+        self.output_dir = None
+        self.experiment_root = None
+        self.timings = defaultdict(float)
+        self.plot_size = (500, 300)
+        self.opto_view = 'spectra'
+        self.ec_pyramids = ResultCache(maxsize=8)
+        self.send_plots = kwargs.get('send_plots', True)
+        self.profiler = Profiler(enabled=bool(kwargs.get('profile')))
+        self.profile_path = kwargs.get('profile') if isinstance(kwargs.get('profile'), str) else None
 
         self._gui_model_queue = kwargs['gui_model_queue']
         self._model_gui_queue = kwargs['model_gui_queue']
+        self.bus = CommandBus(self._gui_model_queue)
+        self.register_handlers()
 
-        self.start()
+        if kwargs.get('start_thread', True):
+            self.start()
 
     def run(self):
         logging.info("model running thread {}".format(threading.get_ident()))
-        while True:
-            try:
-                order, data = self._gui_model_queue.get()
-            except Empty:
-                pass
-            else:
-                if order == "start experiment":
-                    self.run_experiment(data)
-                elif order == 'fit λ(V)':
-                    try:
-                        self.send_lbd_v()
-                    except KeyError:
-                        logging.error("optical file out of scope")
-                elif order == "IODM(V)":
-                    self.send_iodm_v()
-                elif order == 'fit λ(V)+IODM(V)':
-                    self.send_iodm_lbd()
-                elif order == "draw opto cycle":
-                    self.draw_opto_cycle()
-                elif order == "ec cycle":
-                    self.current_cycle = "Cycle {}".format(data)
-                    self.ec_items_from_cycle()
-                elif order == "load opto csv":
-                    self.load_opto_order(data)
-                elif order == "load ec csv":
-                    self.read_ec_csv(data)
-                elif order == "save data":
-                    if self.data_saving and self.data_saving['cycle'] == self.current_cycle:
-                        self.write_csv()
-                        self.save_boundary_spectra()
-                    else:
-                        logging.error("no data to save yet for the current cycle")
-                else:
-                    logging.info("unrecognizable order: {}".format(order))
+        self.bus.run()
+
+    def register_handlers(self):
+        self.bus.register(commands.StartExperiment, self.run_experiment)
+        self.bus.register(commands.FitLambda, self.lbd_v_order)
+        self.bus.register(commands.IodmV, lambda data: self.send_iodm_v())
+        self.bus.register(commands.FitLambdaIodm, lambda data: self.send_iodm_lbd())
+        self.bus.register(commands.DrawOptoCycle, self.draw_opto_order)
+        self.bus.register(commands.ZoomEc, self.zoom_ec_order)
+        self.bus.register(commands.ZoomOpto, self.zoom_opto_order)
+        self.bus.register(commands.SelectEcCycle, self.ec_cycle_order)
+        self.bus.register(commands.LoadOptoCsv, self.load_opto_order)
+        self.bus.register(commands.LoadEcCsv, self.read_ec_csv)
+        self.bus.register(commands.SaveData, self.save_data_order)
+
+    def lbd_v_order(self, data):
+        try:
+            self.send_lbd_v()
+        except KeyError:
+            logging.error("optical file out of scope")
+
+    def ec_cycle_order(self, cycle):
+        """
+        :param cycle: string with cycle name, or int with cycle number
+        """
+        if not isinstance(cycle, str):
+            cycle = "Cycle {}".format(cycle)
+        if cycle not in self.ec_cycles:
+            logging.warning(f"no {cycle} in ec file")
+            return
+        self.current_cycle = cycle
+        self.ec_items_from_cycle()
+
+    def draw_opto_order(self, data):
+        """
+        :param data: None, or dict with 'view' and 'size' of the optical plot
+        """
+        if data:
+            self.opto_view = data.get('view', self.opto_view)
+            self.plot_size = tuple(data.get('size', self.plot_size))
+        self.draw_opto_cycle()
+
+    def zoom_ec_order(self, data):
+        """
+        :param data: dict with visible 'limits' [V min, V max, uA min, uA max] and 'size' of the ec plot
+        """
+        self.ec_items_from_cycle(limits=data['limits'], size=data['size'])
+
+    def zoom_opto_order(self, data):
+        """
+        :param data: dict with visible 'limits' [x min, x max, y min, y max] and 'size' of the optical plot
+        """
+        self.plot_size = tuple(data['size'])
+        self.draw_opto_cycle(limits=data['limits'])
+
+    def plot_points(self, *series):
+        """
+        :param series: 1D arrays of equal length
+        :return: indices of points keeping minima and maxima of each series at the plot width
+        """
+        size = 2 * self.plot_size[0]
+        return np.unique(np.concatenate([minmax_indices(values, size) for values in series]))
+
+    def save_data_order(self, data):
+        if self.data_saving and self.data_saving['cycle'] == self.current_cycle:
+            self.write_csv()
+            self.save_boundary_spectra()
+        else:
+            logging.error("no data to save yet for the current cycle")
 
     def load_opto_order(self, data):
         if len(self.ec_cycles) < 1:
@@ -87,7 +186,13 @@ class Model(threading.Thread):
             self.iodm_range = None
             self._model_gui_queue.put(("opto file loaded", 0))
 
-    def run_experiment(self, root):
+    @staticmethod
+    def find_experiment_dirs(root):
+        """
+        walking experiment tree for directories with ech_pr_*.csv and opto_*.csv files
+        :param root: string path to experiment directory
+        :return: generator of (directory, ec file, opto file) tuples
+        """
         for dir, subdirs, files in os.walk(root):
             ec_file = None
             opto_file = None
@@ -97,56 +202,343 @@ class Model(threading.Thread):
                 elif file.startswith("opto_") and file.endswith(".csv"):
                     opto_file = os.path.join(dir, file)
                 if ec_file and opto_file:
+                    yield dir, ec_file, opto_file
+                    break
+
+    def analysis_params(self):
+        """
+        :return: dict with parameters deciding the results of an experiment directory
+        """
+        iodm_range = None if self.iodm_range is None else [float(wavelength) for wavelength in self.iodm_range]
+        output_root = None if self.output_root is None else os.path.abspath(self.output_root)
+        return {'version': ANALYSIS_VERSION,
+                'iodm_window_size': self.iodm_window_size,
+                'iodm_range': iodm_range,
+                'output_root': output_root}
+
+    @contextmanager
+    def stage(self, name, file=None, cycle=None):
+        """
+        timing a stage of the analysis in self.timings and in a profiler span
+        :param name: name of the stage
+        :param file: string path to the processed file
+        :param cycle: name of the processed cycle
+        :return: span counting items and bytes of the stage, a no-op when profiling is off
+        """
+        start = time.perf_counter()
+        try:
+            with self.profiler.span(name, file, cycle) as span:
+                yield span
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def report_profile(self):
+        if not self.profiler.enabled:
+            return
+        logging.info("profile of the experiment:")
+        self.profiler.log_summary()
+        if self.profile_path is not None:
+            try:
+                self.profiler.export(self.profile_path)
+            except OSError as e:
+                logging.error("unable to save profile: {}".format(e))
+            else:
+                logging.info("profile saved to {}".format(self.profile_path))
+
+    def results_directory(self, dir):
+        """
+        :param dir: string path to experiment directory
+        :return: string path to directory for saved files of dir, None to save them in dir
+        """
+        if self.output_root is None:
+            return None
+        output_dir = os.path.join(self.output_root, os.path.relpath(dir, self.experiment_root))
+        os.makedirs(output_dir, exist_ok=True)
+        return output_dir
+
+    def run_experiment(self, root):
+        self.experiment_root = root
+        self.timings.clear()
+        self.profiler.clear()
+        experiment = list(self.find_experiment_dirs(root))
+        manifest = None
+        if self.incremental:
+            manifest = ExperimentManifest(root)
+            if self.iodm_range is None:
+                self.iodm_range = manifest.iodm_range
+            experiment = self.pending_directories(experiment, manifest)
+        try:
+            if self.workers > 1 and len(experiment) > 1:
+                self.run_experiment_parallel(experiment, manifest)
+            else:
+                for dir, ec_file, opto_file in experiment:
+                    checkpoint()
                     _, dirname = os.path.split(dir)
                     logging.info(f"analysing {dirname}")
-                    self.run_auto_analysis(ec_file, opto_file)
-        self._model_gui_queue.put(("all done", None))
+                    try:
+                        self.output_dir = self.results_directory(dir)
+                        outputs = self.run_auto_analysis(ec_file, opto_file)
+                    except JobCancelled:
+                        raise
+                    except Exception as e:
+                        self.directory_failed(dir, e)
+                    else:
+                        self.directory_done((dir, ec_file, opto_file), outputs, manifest)
+        finally:
+            self.output_dir = None
+            self.report_profile()
+            self._model_gui_queue.put(("all done", None))
+
+    def pending_directories(self, experiment, manifest):
+        """
+        :param experiment: list of (directory, ec file, opto file) tuples
+        :param manifest: ExperimentManifest of the experiment
+        :return: list of directories that are new or changed since they were last analysed
+        """
+        params = self.analysis_params()
+        pending = []
+        for dir, ec_file, opto_file in experiment:
+            if manifest.is_up_to_date(dir, ec_file, opto_file, params):
+                self._model_gui_queue.put(("directory skipped", dir))
+            else:
+                pending.append((dir, ec_file, opto_file))
+        if len(pending) < len(experiment):
+            logging.info(f"{len(experiment) - len(pending)} directories up to date, analysing {len(pending)}")
+        return pending
+
+    def directory_done(self, files, outputs, manifest):
+        """
+        :param outputs: list of saved files, None if input files couldn't be read or results weren't all saved
+        """
+        dir, ec_file, opto_file = files
+        if outputs is None:
+            self.directory_failed(dir, "unreadable input files or unsaved results")
+            return
+        if manifest is not None:
+            manifest.record(dir, ec_file, opto_file, self.analysis_params(), outputs)
+        self._model_gui_queue.put(("directory done", dir))
+
+    def run_experiment_parallel(self, experiment, manifest=None):
+        """
+        analysing experiment directories in a pool of self.workers processes;
+        directories are analysed with the iodm range of the first analysed directory, as in sequential runs;
+        when a worker process dies, e.g. killed for running out of memory, the pool breaks; the directories it left
+        unfinished are analysed again one by one, each in its own process, and the ones killing it are failed
+        :param experiment: list of (directory, ec file, opto file) tuples
+        :param manifest: ExperimentManifest updated after each analysed directory, None to keep no record
+        """
+        logging.info(f"analysing {len(experiment)} directories with {self.workers} processes")
+        unfinished = self.run_pool(experiment, self.workers, manifest)
+        if unfinished:
+            logging.warning(f"worker process died, analysing {len(unfinished)} unfinished directories one by one")
+        for files in unfinished:
+            checkpoint()
+            if self.run_pool([files], 1, manifest):
+                self.directory_failed(files[0], "worker process died")
+
+    def run_pool(self, experiment, workers, manifest=None):
+        """
+        :param experiment: list of (directory, ec file, opto file) tuples
+        :param workers: number of processes
+        :param manifest: ExperimentManifest updated after each analysed directory, None to keep no record
+        :return: list of directories left unfinished because a worker process died
+        """
+        pending = list(experiment)
+        unfinished = []
+        # spawned workers behave the same on Windows and Linux and don't inherit the GUI threads
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn')) as pool:
+            try:
+                while self.iodm_range is None and pending:
+                    checkpoint()
+                    future = self.submit_directory(pool, pending[0])
+                    files = pending.pop(0)
+                    if not self.collect_directory(future, files, manifest):
+                        unfinished.append(files)
+                futures = {self.submit_directory(pool, files): files for files in pending}
+                pending = []
+                for future in as_completed(futures):
+                    if not self.collect_directory(future, futures[future], manifest):
+                        unfinished.append(futures[future])
+                    checkpoint()
+            except BrokenProcessPool:
+                # the pool broke while directories were submitted
+                unfinished.extend(pending)
+            except JobCancelled:
+                # directories already being analysed are finished, the rest are dropped
+                pool.shutdown(cancel_futures=True)
+                raise
+        return unfinished
+
+    def submit_directory(self, pool, files):
+        dir, ec_file, opto_file = files
+        return pool.submit(analyse_directory, ec_file, opto_file, self.iodm_range, self.iodm_window_size,
+                           self.use_parse_cache, self.results_directory(dir), self.opto_memory_mb,
+                           self.profiler.enabled)
+
+    def collect_directory(self, future, files, manifest=None):
+        """
+        :return: bool; False if the directory is unfinished because a worker process died
+        """
+        dir = files[0]
+        try:
+            result = future.result()
+        except BrokenProcessPool:
+            return False
+        except Exception as e:
+            self.directory_failed(dir, e)
+        else:
+            if self.iodm_range is None:
+                self.iodm_range = result['iodm_range']
+            for name, seconds in result['timings'].items():
+                self.timings[name] += seconds
+            # span starts of the worker are moved to the timeline of this process
+            self.profiler.extend(result['spans'], result['epoch'])
+            _, dirname = os.path.split(dir)
+            logging.info(f"{dirname} analysed")
+            self.directory_done(files, result['outputs'], manifest)
+        return True
+
+    def directory_failed(self, dir, error):
+        """
+        :param error: exception or string with the reason of the failure
+        """
+        _, dirname = os.path.split(dir)
+        reason = error if isinstance(error, str) else repr(error)
+        logging.error(f"analysis of {dirname} failed: {reason}")
+        self._model_gui_queue.put(("directory failed", (dir, reason)))
 
     def run_auto_analysis(self, ec_file, opto_file):
-        success_ec = self.read_ec_csv(ec_file)
+        """
+        analysing all cycles of a directory and saving their results
+        :return: list with paths of saved files, None if input files couldn't be read
+        """
+        with self.stage('read ec', ec_file) as span:
+            success_ec = self.read_ec_csv(ec_file)
+            if success_ec:
+                span.count(items=sum(len(cycle.V) for cycle in self.ec_cycles.values()))
         if not success_ec:
-            return
-        success_opto = self.read_opto_cycle_csv(opto_file)
+            return None
+        with self.stage('read opto', opto_file):
+            success_opto = self.read_opto_cycle_csv(opto_file)
         if not success_opto:
-            return
+            return None
+        outputs = []
         for cycle in self.ec_cycles:
+            checkpoint()
             self.current_cycle = cycle
-            self.ec_items_from_cycle()
-            self.draw_opto_cycle()
-            self.send_iodm_lbd()
-            self.write_csv()
-            self.save_boundary_spectra()
+            with self.stage('load opto cycle', opto_file, cycle) as span:
+                span.count(items=len(self.opto_cycles[cycle].transmission))
+            if self.send_plots:
+                self.ec_items_from_cycle()
+                self.draw_opto_cycle()
+            with self.stage('fit λ and IODM', opto_file, cycle) as span:
+                self.send_iodm_lbd()
+                if self.data_saving and self.data_saving['cycle'] == cycle:
+                    span.count(items=len(self.data_saving['v']))
+            with self.stage('write csv', opto_file, cycle) as span:
+                outputs.append(self.write_csv())
+                span.count(bytes_written=self.output_size(outputs[-1]))
+            with self.stage('boundary spectra', opto_file, cycle) as span:
+                outputs.append(self.save_boundary_spectra())
+                span.count(bytes_written=self.output_size(outputs[-1]))
+        if None in outputs:
+            # an incomplete directory is analysed again by the next incremental run
+            return None
+        return outputs
+
+    @staticmethod
+    def output_size(filename):
+        return 0 if filename is None else os.path.getsize(filename)
+
+    def cycle_key(self):
+        """
+        :return: tuple identifying results of the current cycle for the loaded files, e.g. fit λ and boundary spectra
+        """
+        return ((self.ec_fingerprint, self.opto_fingerprint),
+                self.current_cycle,
+                ANALYSIS_VERSION)
+
+    def iodm_key(self, iodm_range):
+        """
+        :param iodm_range: [first, last] wavelength of the iodm range, None for the automatic range
+        :return: tuple identifying IODM of the current cycle for the iodm range
+        """
+        if iodm_range is None:
+            return self.cycle_key() + (('auto', self.iodm_window_size),)
+        return self.cycle_key() + (tuple(float(wavelength) for wavelength in iodm_range),)
+
+    def cycle_results(self):
+        """
+        :return: dict from self.results with fit λ and fit range of the current cycle
+        """
+        return self.results.entry(self.cycle_key())
+
+    def cycle_fit(self):
+        """
+        :return: dict with fitted minimum wavelength for each ec_id of the current cycle
+        """
+        results = self.cycle_results()
+        if 'fit_lbd' not in results:
+            cycle = self.opto_cycles[self.current_cycle]
+            with self.profiler.span('fit', cycle=self.current_cycle) as span:
+                results['fit_lbd'] = cycle.calc_auto_fit()
+                span.count(items=len(results['fit_lbd']))
+            results['fit_range'] = cycle.fit_range
+        return results['fit_lbd']
+
+    def cycle_iodm(self):
+        """
+        IODM of the current cycle; with no iodm range set, the range is chosen automatically and kept
+        :return: dict with IODM for each ec_id of the current cycle
+        """
+        results = self.results.entry(self.iodm_key(self.iodm_range))
+        if 'iodm' not in results:
+            cycle = self.opto_cycles[self.current_cycle]
+            with self.profiler.span('IODM', cycle=self.current_cycle) as span:
+                if self.iodm_range is None:
+                    results['iodm'], wavelength_start, wavelength_stop = cycle.automatic_IODM(
+                        cycle.transmission.keys(), self.iodm_window_size)
+                    results['iodm_range'] = [wavelength_start, wavelength_stop]
+                else:
+                    results['iodm'] = cycle.send_IODM(cycle.transmission.keys(), self.iodm_range)
+                span.count(items=len(results['iodm']))
+        if self.iodm_range is None:
+            # the automatic range is a result of the first cycle; its IODM is the IODM of the cycle in that range
+            self.iodm_range = results['iodm_range']
+            self.results.entry(self.iodm_key(self.iodm_range)).setdefault('iodm', results['iodm'])
+        return results['iodm']
 
     def send_iodm_v(self):
-        cycle = self.opto_cycles[self.current_cycle]
         cycle_ec_V = self.ec_cycles[self.current_cycle].V
-        if self.iodm_range is None:
-            iodm_dict, wavelength_start, wavelength_stop = cycle.automatic_IODM(cycle.transmission.keys(),
-                                                                                self.iodm_window_size)
-            self.iodm_range = [wavelength_start, wavelength_stop]
-        else:
-            iodm_dict = cycle.send_IODM(cycle.transmission.keys(), self.iodm_range)
+        iodm_dict = self.cycle_iodm()
         _, iodm = zip(*iodm_dict.items())
-        self._model_gui_queue.put(("IODM(V)", (cycle_ec_V, iodm, self.current_cycle)))
+        if len(cycle_ec_V) != len(iodm):
+            logging.error("lengths of data arrays don't match")
+            return
+        points = self.plot_points(iodm)
+        self._model_gui_queue.put(("IODM(V)", payload("IODM(V)", cycle=self.current_cycle,
+                                                      x=np.asarray(cycle_ec_V)[points], y=np.asarray(iodm)[points])))
 
     def send_iodm_lbd(self):
-        cycle = self.opto_cycles[self.current_cycle]
         try:
-            fit_lbd_dict = cycle.calc_auto_fit()
+            fit_lbd_dict = self.cycle_fit()
+        except OptoParseError as e:
+            logging.error(e)
+            return
         except ValueError:
             logging.error("empty cycle")
             return
-        if self.iodm_range is None:
-            iodm_dict, iodm_wavelength_start, iodm_wavelength_stop = cycle.automatic_IODM(cycle.transmission.keys(),
-                                                                                          self.iodm_window_size)
-            self.iodm_range = [iodm_wavelength_start, iodm_wavelength_stop]
-        else:
-            iodm_dict = cycle.send_IODM(cycle.transmission.keys(), self.iodm_range)
+        iodm_dict = self.cycle_iodm()
         _, iodm = zip(*iodm_dict.items())
         _, fit_lbd = zip(*fit_lbd_dict.items())
         cycle_ec_V = self.ec_cycles[self.current_cycle].V
         if len(cycle_ec_V) == len(iodm) == len(fit_lbd):
-            self._model_gui_queue.put(('fit λ(V)+IODM(V)', (cycle_ec_V, iodm, fit_lbd, self.current_cycle)))
+            if self.send_plots:
+                points = self.plot_points(fit_lbd, iodm)
+                self._model_gui_queue.put(('fit λ(V)+IODM(V)', payload('fit λ(V)+IODM(V)', cycle=self.current_cycle,
+                                                                       V=np.asarray(cycle_ec_V)[points],
+                                                                       lbd=np.asarray(fit_lbd)[points],
+                                                                       iodm=np.asarray(iodm)[points])))
             self.data_saving = dict({"v": cycle_ec_V,
                                      "cycle": self.current_cycle,
                                      "iodm": iodm,
@@ -154,24 +546,36 @@ class Model(threading.Thread):
         else:
             logging.error("lengths of data arrays don't match")
 
+    def boundary_spectra(self):
+        """
+        spectra of the current cycle at its significant ec points
+        :return: (2D array with one spectrum per column, header string), None if spectra are missing
+        """
+        results = self.boundaries.entry(self.cycle_key())
+        if 'boundary' not in results:
+            cycle_opto = self.opto_cycles[self.current_cycle]
+            cycle_ec = self.ec_cycles[self.current_cycle]
+            cycle_ec_idx0 = cycle_ec.id[0]
+            cycle_ec.pick_significant_points()
+            boundary_opto, boundary_keys = [], []
+            for boundary_point in cycle_ec.id_dict:
+                boundary_meas_idx = cycle_ec.id_dict[boundary_point]
+                try:
+                    for idx in boundary_meas_idx:
+                        boundary_opto.append(cycle_opto.transmission[cycle_ec_idx0+idx])
+                        boundary_keys.append("{}={}[V],".format(boundary_point, cycle_ec.V[idx]))
+                except KeyError:
+                    return None
+            boundary_opto_np = np.array(boundary_opto)
+            results['boundary'] = (boundary_opto_np.transpose(), "".join(boundary_keys))
+        return results['boundary']
+
     def save_boundary_spectra(self):
-        cycle_opto = self.opto_cycles[self.current_cycle]
-        cycle_ec = self.ec_cycles[self.current_cycle]
-        cycle_ec_idx0 = cycle_ec.id[0]
-        cycle_ec.pick_significant_points()
-        boundary_opto, boundary_keys = [], []
-        for boundary_point in cycle_ec.id_dict:
-            boundary_meas_idx = cycle_ec.id_dict[boundary_point]
-            try:
-                for idx in boundary_meas_idx:
-                    boundary_opto.append(cycle_opto.transmission[cycle_ec_idx0+idx])
-                    boundary_keys.append("{}={}[V],".format(boundary_point, cycle_ec.V[idx]))
-            except KeyError:
-                logging.error("unable to save file")
-                return
-        boundary_opto_np = np.array(boundary_opto)
-        data_vertical = boundary_opto_np.transpose()
-        header = "".join(boundary_keys)
+        boundary = self.boundary_spectra()
+        if boundary is None:
+            logging.error("unable to save file")
+            return None
+        data_vertical, header = boundary
         filename = self.filename.replace(".csv", f"_boundary_spectra_{self.current_cycle}.csv")
         try:
             np.savetxt(filename, data_vertical, delimiter=',', header=header, fmt="%d")
@@ -180,6 +584,8 @@ class Model(threading.Thread):
                 logging.error("close file before saving")
             else:
                 logging.error("unable to save data to file. file path may be too long")
+            return None
+        return filename
 
     def write_csv(self):
         v = self.data_saving['v']
@@ -203,15 +609,18 @@ class Model(threading.Thread):
                 logging.error("close all files before saving")
             else:
                 logging.error("unexpected error, unable to save file")
+            return None
+        return filename
 
     def send_lbd_v(self):
-        cycle = self.opto_cycles[self.current_cycle]
-        fit_lbd_dict = cycle.calc_auto_fit()
-        fit_lbd = fit_lbd_dict.values()
+        fit_lbd_dict = self.cycle_fit()
+        fit_lbd = np.fromiter(fit_lbd_dict.values(), dtype=float, count=len(fit_lbd_dict))
         cycle_ec_V = self.ec_cycles[self.current_cycle].V
         if len(cycle_ec_V) == len(fit_lbd):
             logging.info(f"plotting lbd(V) for {self.current_cycle}")
-            self._model_gui_queue.put(("fit λ(V)", (cycle_ec_V, fit_lbd, self.current_cycle)))
+            points = self.plot_points(fit_lbd)
+            self._model_gui_queue.put(("fit λ(V)", payload("fit λ(V)", cycle=self.current_cycle,
+                                                          x=np.asarray(cycle_ec_V)[points], y=fit_lbd[points])))
         else:
             logging.warning("number of ec and optical measurements don't match")
 
@@ -231,55 +640,91 @@ class Model(threading.Thread):
             wavelength = np.linspace(344.6122, 1041.1877, num=length)
         return wavelength
 
+    def index_file(self, filename):
+        """
+        line_offsets of filename, counting its bytes as read in the profiler
+        """
+        self.profiler.count(bytes_read=os.path.getsize(filename))
+        return line_offsets(filename)
+
+    def parse_ec_file(self, filename):
+        """
+        parse_ec_csv of filename, counting its bytes as read in the profiler
+        """
+        self.profiler.count(bytes_read=os.path.getsize(filename))
+        return parse_ec_csv(filename)
+
     def read_opto_cycle_csv(self, filename):
         """
-        reading optical file into separate cycles
+        indexing optical file for reading its cycles on demand
         :param filename: string path to file
         :return: bool success
         """
         _, fname = os.path.split(filename)
         logging.info("reading file: {}".format(fname))
         self.filename = self.convert_filename(filename)
+        if self.output_dir is not None:
+            self.filename = os.path.join(self.output_dir, os.path.basename(self.filename))
+        cycles = {cycle: self.ec_cycles[cycle].id for cycle in self.ec_cycles}
+
+        # one pass over the file for byte offsets of its rows; rows of a cycle are read when it is first used
         try:
-            data = open(filename)
+            offsets = cached_parse(filename, 'index', lambda: {'offsets': self.index_file(filename)},
+                                   use_cache=self.use_parse_cache)['offsets']
+            pixels = read_opto_pixels(filename)
         except FileNotFoundError:
             return False
+        except ValueError:
+            logging.warning("This doesn't look like the right type of file")
+            return False
+        self.opto_fingerprint = self.fingerprint(filename)
+        self.profiler.count(items=len(offsets) - 1)
+        wavelength = self.read_wavelengths(pixels) if pixels else None
 
-        self.opto_cycles = dict.fromkeys(self.ec_cycles.keys())
-        tmp = dict.fromkeys(self.ec_cycles.keys())
-
-        for cycle in self.ec_cycles:
-            tmp[cycle] = []
-
-        for num, row in enumerate(data):
-            for cycle in self.ec_cycles:
-                if self.ec_cycles[cycle].id[0] <= num <= self.ec_cycles[cycle].id[1]:
-                    row = row.split(',')
-                    try:
-                        row = [int(x) for x in row]
-                        tmp[cycle].append(row)
-                    except ValueError:
-                        logging.warning("This doesn't look like the right type of file")
-                        return False
-                else:
-                    pass
-
-        for cycle in tmp:
-            if tmp[cycle]:
-                tmp_array = np.array(tmp[cycle])[:, 2:]
-                _, length = tmp_array.shape
-                wavelength = self.read_wavelengths(length)
-                new_cycle = OptoCycleDataset()
-                new_cycle.wavelength = wavelength
-                new_cycle.insert_opto_from_csv(tmp_array, self.ec_cycles[cycle].id)
-                self.opto_cycles[cycle] = new_cycle
-            else:
-                logging.warning(f"missing {cycle}; generating empty cycle")
-                self.opto_cycles[cycle] = self.insert_empty_cycle(self.ec_cycles[cycle].id)
+        def load_cycle(cycle):
+            return self.load_opto_cycle(filename, offsets, cycles[cycle], cycle, wavelength)
+        self.opto_cycles = OptoCycleStore(cycles, load_cycle, prefetch=self.prefetch, budget_mb=self.opto_memory_mb)
+        self._model_gui_queue.put(("cycle summaries", self.cycle_summaries(len(offsets) - 1)))
 
         logging.info("optical file loaded")
         return True
 
+    def load_opto_cycle(self, filename, offsets, ids, cycle, wavelength):
+        """
+        reading rows of one cycle of an optical file
+        :param filename: string path to file
+        :param offsets: array with byte offsets of the file's rows
+        :param ids: [first, last] ec_ids of the cycle
+        :param cycle: string; name of the cycle
+        :param wavelength: array with wavelength of each pixel
+        :return: OptoCycleDataset, an empty one if the file has no rows of the cycle
+        :raise OptoParseError: if rows of the cycle cannot be parsed
+        """
+        first_id, last_id = ids
+        def parse():
+            last_row = len(offsets) - 1
+            self.profiler.count(bytes_read=offsets[min(last_id + 1, last_row)] - offsets[min(first_id, last_row)])
+            return {'matrix': read_opto_rows(filename, offsets, first_id, last_id)}
+
+        with self.profiler.span('parse opto cycle', filename, cycle) as span:
+            try:
+                opto_data = cached_parse(filename, f'opto_{first_id}_{last_id}', parse,
+                                         use_cache=self.use_parse_cache)
+            except ValueError as e:
+                raise OptoParseError("cannot parse {} of {}, rows {}-{}: {}".format(
+                    cycle, os.path.basename(filename), first_id, last_id, e)) from e
+            matrix = opto_data['matrix']
+            span.count(items=len(matrix))
+        if not len(matrix):
+            logging.warning(f"missing {cycle}; generating empty cycle")
+            return self.insert_empty_cycle(ids)
+        with self.profiler.span('fit range', filename, cycle):
+            new_cycle = OptoCycleDataset()
+            new_cycle.wavelength = wavelength
+            new_cycle.fft_workers = self.workers
+            new_cycle.insert_opto_from_csv(SpectraMatrix(matrix, first_id=first_id), ids)
+        return new_cycle
+
     @staticmethod
     def insert_empty_cycle(ids):
         new_cycle = OptoCycleDataset()
@@ -289,11 +734,35 @@ class Model(threading.Thread):
         new_cycle.insert_opto_from_csv(input, ids)
         return new_cycle
 
-    def draw_opto_cycle(self):
+    def draw_opto_cycle(self, limits=None):
+        """
+        :param limits: visible [x min, x max, y min, y max] of a zoomed plot, None for the whole cycle
+        """
         logging.info("drawing optical data for {}".format(self.current_cycle))
         if self.opto_cycles:
-            opto_cycle = self.opto_cycles[self.current_cycle]
-            self._model_gui_queue.put(("draw opto", (opto_cycle, self.current_cycle)))
+            width, height = self.plot_size
+            wavelength_range = None if limits is None else limits[:2]
+            try:
+                opto_cycle = self.opto_cycles[self.current_cycle]
+                if self.opto_view == 'heatmap':
+                    ec_range = None if limits is None else limits[2:]
+                    image, extent = opto_cycle.spectra_image(height, width, ec_range, wavelength_range)
+                    message = ("draw opto image", payload("draw opto image", cycle=self.current_cycle, limits=limits,
+                                                          image=image, extent=tuple(float(x) for x in extent)))
+                else:
+                    wavelength, spectra = opto_cycle.decimated_spectra(width, wavelength_range)
+                    message = ("draw opto", payload("draw opto", cycle=self.current_cycle, limits=limits,
+                                                    wavelength=wavelength, spectra=spectra))
+            except OptoParseError as e:
+                logging.error(e)
+                return
+            except (KeyError, ValueError):
+                if limits is not None:
+                    logging.debug("no optical data in view")
+                    return
+                logging.error("cannot draw optical data. ec file not loaded or opto file missing cycle")
+                return
+            self._model_gui_queue.put(message)
         else:
             logging.info("optical file not loaded")
 
@@ -303,72 +772,94 @@ class Model(threading.Thread):
         logging.info("reading file: {}".format(fname))
         success = self.read_ec_cycles_csv(filename)
         if success:
-            self._model_gui_queue.put(("number of cycles", len(self.ec_cycles)))
-            self.current_cycle = "Cycle 0"
-            self.ec_items_from_cycle()
+            self._model_gui_queue.put(("cycle summaries", self.cycle_summaries()))
+            self.current_cycle = next(iter(self.ec_cycles))
+            if self.send_plots:
+                self.ec_items_from_cycle()
             return True
         else:
             return False
 
+    def cycle_summaries(self, opto_rows=None):
+        """
+        summary statistics of all cycles, taken from ec data and the optical file index without loading spectra
+        :param opto_rows: number of rows of the optical file, None if not loaded
+        :return: list of dicts from ElectroChemStore.summaries, with number of optical spectra of each cycle
+        """
+        summaries = self.ec_store.summaries()
+        for summary in summaries:
+            first_id, last_id = summary['ids']
+            summary['spectra'] = None if opto_rows is None else max(0, min(last_id + 1, opto_rows) - first_id)
+        return summaries
+
     def read_ec_cycles_csv(self, filename):
         self.ec_cycles = {}
         try:
-            data = open(filename)
+            ec_data = cached_parse(filename, 'ec', lambda: self.parse_ec_file(filename), use_cache=self.use_parse_cache)
         except FileNotFoundError:
             return False
-        cycles_count = 0
-        # corrupted_rows = 0
-        V, uA = [], []
-        key, first_meas_id = None, None
-        for num, row in enumerate(data):
-            try:
-                tmp_v, tmp_ua = row.split(', ')
-            except ValueError:
-                logging.error("wrong file type")
-                return False
-            try:
-                V.append(float(tmp_v))
-                uA.append(float(tmp_ua))
-            except ValueError:
-                if row.startswith('Cycle'):
-                    cycles_count = cycles_count + 1
-                    row_number = num - cycles_count
-                    if key:
-                        # create a new cycle, populate ec_cycles_dict
-                        new_ec_cycle = ElectroChemCycle(key, V=V, uA=uA, id=[first_meas_id, row_number])
-                        self.ec_cycles[key] = new_ec_cycle
-                        V, uA = [], []
-                    key = row.split(', ')[0]
-                    first_meas_id = row_number + 1
-                elif tmp_v == 'None' or tmp_ua == 'None':
-                    logging.warning("file might be corrupted")
-                    # corrupted_rows = corrupted_rows + 1
-                    V.append(np.nan)
-                    uA.append(np.nan)
-                else:
-                    logging.warning("this doesn't seem like the right type of file")
-                    return False
-        if key:
-            # adding last cycle to the cycles dictionary
-            new_ec_cycle = ElectroChemCycle(key, V=V, uA=uA, id=[first_meas_id, num-cycles_count])
-            self.ec_cycles[key] = new_ec_cycle
-        else:
-            # if ec file has no info on cycles then a single "cycle 0" is created
-            new_ec_cycle = ElectroChemCycle('Cycle 0', V=V, uA=uA, id=[0, num])
-            self.ec_cycles['Cycle 0'] = new_ec_cycle
+        if ec_data is None:
+            return False
+        self.ec_fingerprint = self.fingerprint(filename)
+        self.ec_store = ElectroChemStore.from_arrays(ec_data)
+        self.ec_cycles = self.ec_store.cycles()
         return True
 
-    def ec_items_from_cycle(self):
+    @staticmethod
+    def fingerprint(filename):
+        fingerprint = file_fingerprint(filename)
+        return fingerprint['path'], fingerprint['size'], fingerprint['mtime'], fingerprint['content']
+
+    def ec_pyramid(self):
+        """
+        :return: TracePyramid of the current ec cycle, built on first use
+        """
+        entry = self.ec_pyramids.entry((self.ec_fingerprint, self.current_cycle))
+        if 'pyramid' not in entry:
+            cycle = self.ec_cycles[self.current_cycle]
+            entry['pyramid'] = TracePyramid(cycle.V, cycle.uA)
+        return entry['pyramid']
+
+    def ec_items_from_cycle(self, limits=None, size=None):
+        """
+        :param limits: visible [V min, V max, uA min, uA max] of a zoomed plot, None for the whole cycle
+        :param size: (width, height) of the ec plot [pixels], self.plot_size if None
+        """
         if len(self.ec_cycles) > 0:
-            cycle_ec_uA = self.ec_cycles[self.current_cycle].uA
-            cycle_ec_V = self.ec_cycles[self.current_cycle].V
-            self._model_gui_queue.put(("draw ec", (cycle_ec_uA, cycle_ec_V, self.current_cycle)))
+            width = (size or self.plot_size)[0]
+            pyramid = self.ec_pyramid()
+            if limits is None:
+                points = pyramid.query(2 * width)
+            else:
+                points = pyramid.query(2 * width, xlim=limits[:2], ylim=limits[2:])
+            cycle_ec_V, cycle_ec_uA = pyramid.points(points)
+            self._model_gui_queue.put(("draw ec", payload("draw ec", cycle=self.current_cycle, limits=limits,
+                                                          V=cycle_ec_V, uA=cycle_ec_uA)))
         else:
             logging.info("ec file not loaded")
 
-    @staticmethod
-    def find_nearest_lambda(lambda_nm, wavelength_array):
-        # find nearest value, return index
-        diff = [abs(item - lambda_nm) for item in wavelength_array]
-        idx = diff.index(min(diff))
-        return idx
+
+def analyse_directory(ec_file, opto_file, iodm_range, iodm_window_size, use_parse_cache, output_dir=None,
+                      opto_memory_mb=1024, profile=False):
+    """
+    running Model.run_auto_analysis for a single experiment directory, in a worker process
+    :param ec_file: string path to ech_pr_*.csv file
+    :param opto_file: string path to opto_*.csv file
+    :param iodm_range: list with first and last wavelength of iodm range, None for automatic range
+    :param iodm_window_size: approximate size of automatic iodm wavelength window
+    :param use_parse_cache: bool; keep parsed files in sidecar .npy caches
+    :param output_dir: string path to directory for saved files, None to save them next to opto_file
+    :param opto_memory_mb: memory budget for spectra of loaded optical cycles [MB]
+    :param profile: bool; record profiler spans
+    :return: dict with iodm range used for the directory, list of saved files (None if inputs couldn't be read),
+    seconds spent in analysis stages, profiler spans and epoch of their profiler
+    """
+    model = Model(model_gui_queue=Queue(), gui_model_queue=None, start_thread=False, opto_memory_mb=opto_memory_mb,
+                  profile=profile, send_plots=False)
+    model.iodm_range = iodm_range
+    model.iodm_window_size = iodm_window_size
+    model.use_parse_cache = use_parse_cache
+    model.output_dir = output_dir
+    outputs = model.run_auto_analysis(ec_file, opto_file)
+    return {'iodm_range': model.iodm_range, 'outputs': outputs, 'timings': dict(model.timings),
+            'spans': model.profiler.spans, 'epoch': model.profiler.epoch}
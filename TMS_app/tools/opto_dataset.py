@@ -1,23 +1,91 @@
-from itertools import islice
 import numpy as np
-from scipy.signal import general_gaussian
-from collections import OrderedDict
-from scipy.optimize import curve_fit
 import logging
+from TMS_app.tools.commands import checkpoint
+from TMS_app.tools.decimation import SpectraPyramid, minmax_reduce
+from TMS_app.tools.fitting import QuadraticFit
+from TMS_app.tools.smoothing import fft_smooth
+from TMS_app.tools.spectra import SpectraMatrix
+from TMS_app.tools.wavelength import WavelengthAxis
+
+# spectra processed between two cancellation checkpoints
+CHECKPOINT_ROWS = 2048
 
 
 class OptoDatasetB:
     def __init__(self):
         self.name = ""
         self.wavelength = []
-        self.transmission = OrderedDict()
+        self.transmission = SpectraMatrix(np.empty((0, 0)))
         self.fit_range = None
         self.iodm_initial_range = None
         self.ec_ids = []
+        self.quadratic_fit = None
+        self.fft_workers = None
+        self.pyramid = None
+
+    @property
+    def wavelength(self):
+        return self._wavelength
+
+    @wavelength.setter
+    def wavelength(self, wavelength):
+        self._wavelength = wavelength
+        self.wavelength_axis = WavelengthAxis(wavelength)
 
     def generate_data_for_plotting(self):
-        transmission_sub_dict = dict(islice(self.transmission.items(), 0, None, 20))
-        return transmission_sub_dict, self.wavelength
+        transmission_sub = self.transmission.subsample(20)
+        return transmission_sub, self.wavelength
+
+    def decimated_spectra(self, width, wavelength_range=None):
+        """
+        every 20th spectrum, reduced to minimum and maximum of the pixels falling on each column of a plot
+        :param width: plot width [pixels]
+        :param wavelength_range: (first, last) visible wavelength, None for the whole spectra
+        :return: (1D array with wavelength of each point, 2D array with one spectrum per row)
+        """
+        transmission, wavelength = self.generate_data_for_plotting()
+        pixels = self.visible_pixels(wavelength_range)
+        spectra, columns = minmax_reduce(transmission.block()[:, pixels], 2 * width, axis=1)
+        return np.asarray(wavelength)[pixels][columns], spectra
+
+    def visible_pixels(self, wavelength_range=None):
+        """
+        :return: slice of pixels within wavelength_range and one more pixel on each side, all pixels if None
+        :raise ValueError: if wavelength_range doesn't overlap the spectra
+        """
+        if wavelength_range is None:
+            return slice(0, len(self.wavelength))
+        low, high = sorted(wavelength_range)
+        if high < self.wavelength_axis.sorted[0] or low > self.wavelength_axis.sorted[-1]:
+            raise ValueError("wavelength range outside of spectra")
+        first, last = sorted(self.wavelength_axis.nearest([low, high]))
+        return slice(max(first - 1, 0), last + 2)
+
+    def spectra_image(self, height, width, ec_range=None, wavelength_range=None):
+        """
+        spectra as one image of at most height x width pixels, keeping extremes of binned pixels;
+        served from a min/max pyramid of the spectra, built on first use
+        :param height: maximal number of image rows, spectra are binned along rows
+        :param width: maximal number of image columns, wavelength pixels are binned along columns
+        :param ec_range: (first, last) visible ec_id, None for all spectra of the cycle
+        :param wavelength_range: (first, last) visible wavelength, None for the whole spectra
+        :return: (2D array, [first wavelength, last wavelength, first ec_id, last ec_id] of the image)
+        """
+        block = self.transmission.block()
+        if self.pyramid is None or self.pyramid.matrix is not block:
+            self.pyramid = SpectraPyramid(block)
+        ids = self.transmission.ids
+        rows = (0, ids.shape[0])
+        if ec_range is not None:
+            first, last = sorted(ec_range)
+            rows = (max(int(np.searchsorted(ids, first, side='right')) - 1, 0),
+                    min(int(np.searchsorted(ids, last, side='left')) + 1, ids.shape[0]))
+        pixels = self.visible_pixels(wavelength_range)
+        pixels = (pixels.start, min(pixels.stop, len(self.wavelength)))
+        image, rows = self.pyramid.query(rows, pixels, height, width)
+        if not image.size or rows[1] <= rows[0]:
+            raise ValueError("no spectra in range")
+        return image, [self.wavelength[pixels[0]], self.wavelength[pixels[1] - 1], ids[rows[0]], ids[rows[1] - 1]]
 
     def calc_sum_of_transmission(self, ec_id, wavelength_range):
         transmission = self.transmission[ec_id]
@@ -25,13 +93,12 @@ class OptoDatasetB:
         return sum_of_transmission
 
     def send_IODM(self, ec_ids, wavelength_range):
-        iodm = {}
+        ec_ids = list(ec_ids)
         ref_id = min(self.ec_ids)
-        wavelength_range_idx = [self.find_nearest(wavelength_range[0])[0], self.find_nearest(wavelength_range[1])[0]]
-        ref = self.calc_sum_of_transmission(ref_id, wavelength_range_idx)
-        for ec_id in ec_ids:
-            sum = self.calc_sum_of_transmission(ec_id, wavelength_range_idx)
-            iodm[ec_id] = sum/ref
+        pixels = self.wavelength_axis.to_slice(wavelength_range[0], wavelength_range[1])
+        ref = self.calc_sum_of_transmission(ref_id, [pixels.start, pixels.stop])
+        sums = self.spectra_block(ec_ids)[:, pixels].sum(axis=1)
+        iodm = dict(zip(ec_ids, sums/ref))
         return iodm
 
     def automatic_IODM(self, ec_ids, window_size):
@@ -41,52 +108,80 @@ class OptoDatasetB:
         :return: list of IODM values
         '''
         # window size from nm to number of samples
-        window_size_smpl, _ = self.find_nearest(self.wavelength[0]+window_size)
-        cutoff_wvlgth, _ = self.find_nearest(700)
+        window_size_smpl, cutoff_wvlgth = map(int, self.wavelength_axis.nearest([self.wavelength[0]+window_size, 700]))
         # calc ftrans in running window
         ftrans_matrix = self.running_ftrans(ec_ids, window_size_smpl, cutoff=cutoff_wvlgth)
         # pick wavelength of maximal iodm amplitude
-        diff, num_diff = 0, 0
-        for num, row in enumerate(ftrans_matrix.transpose()):
-            tmp = row.max()-row.min()
-            if tmp > diff and self.iodm_initial_range[0]-window_size <= num <= self.iodm_initial_range[1]:
-                diff = tmp
-                num_diff = num
-        iodm_lst = ftrans_matrix.transpose()[num_diff]
+        amplitude = ftrans_matrix.max(axis=0) - ftrans_matrix.min(axis=0)
+        window_start = np.arange(amplitude.shape[0])
+        in_range = (self.iodm_initial_range[0]-window_size <= window_start) & \
+                   (window_start <= self.iodm_initial_range[1])
+        # first window of maximal amplitude; 0 if no window in range has positive amplitude
+        num_diff = int(np.argmax(np.where(in_range & (amplitude > 0), amplitude, 0)))
+        iodm_lst = ftrans_matrix[:, num_diff]
         iodm_dict = {ec_id: iodm_lst[num] for num, ec_id in enumerate(ec_ids)}
         return iodm_dict, self.wavelength[num_diff], self.wavelength[num_diff+window_size_smpl]
 
+    def spectra_block(self, ec_ids, cutoff=None):
+        """
+        stacking spectra of given measurements into one 2D array
+        :param ec_ids: iterable with measurement ids
+        :param cutoff: number of leading pixels to keep, all if None
+        :return: 2D numpy array, one spectrum per row
+        """
+        return self.stack_spectra(self.transmission, ec_ids)[:, :cutoff]
+
+    @staticmethod
+    def stack_spectra(transmission, ec_ids=None):
+        """
+        :param transmission: SpectraMatrix or dict with spectra, keys are ec_ids
+        :param ec_ids: iterable with measurement ids, all keys of transmission if None
+        :return: 2D numpy array, one spectrum per row
+        """
+        if isinstance(transmission, SpectraMatrix):
+            return transmission.block(ec_ids)
+        if ec_ids is None:
+            ec_ids = transmission
+        return np.array([transmission[ec_id] for ec_id in ec_ids])
+
+    @staticmethod
+    def window_sums(block, window_size):
+        """
+        sums of all running windows of every spectrum, taken as differences of cumulative sums;
+        like the original running window, the window ending at the last pixel is skipped
+        :param block: 2D array, one spectrum per row
+        :param window_size: number of pixels in window
+        :return: 2D array of shape (spectra, pixels - window_size)
+        """
+        block = np.asarray(block)
+        if np.issubdtype(block.dtype, np.integer):
+            block = block.astype(np.int64)
+        cumsum = np.zeros((block.shape[0], block.shape[1] + 1), dtype=block.dtype)
+        np.cumsum(block, axis=1, out=cumsum[:, 1:])
+        return cumsum[:, window_size:-1] - cumsum[:, :-window_size-1]
+
     def running_ftrans(self, ec_ids, window_size, cutoff=None):
         if cutoff is None:
             cutoff = len(self.wavelength)
-        ftrans_matrix = []
-        ftrans_reference = []
         # getting first transmission spectrum
-        ref = next(iter(self.transmission.items()))[1][:cutoff]
-        for num, _ in enumerate(ref[:-window_size]):
-            ref_chunk = ref[num:num + window_size]
-            ref_val = ref_chunk.sum()
-            ftrans_reference.append(ref_val)
-        for ec_id in ec_ids:
-            row = self.transmission[ec_id][:cutoff]
-            ftrans_array = []
-            sum_array = []
-            for num, _ in enumerate(row[:-window_size]):
-                sum = row[num:num + window_size].sum()
-                sum_array.append(sum)
-                ftrans_value = sum / ftrans_reference[num]
-                ftrans_array.append(ftrans_value)
-            ftrans_matrix.append(ftrans_array)
-        return np.array(ftrans_matrix)
+        ref = next(iter(self.transmission.values()))[:cutoff]
+        ftrans_reference = self.window_sums(ref[np.newaxis, :], window_size)
+        block = self.spectra_block(ec_ids, cutoff)
+        ftrans_matrix = np.empty((block.shape[0], ftrans_reference.shape[1]))
+        for row in range(0, block.shape[0], CHECKPOINT_ROWS):
+            checkpoint()
+            rows = slice(row, row + CHECKPOINT_ROWS)
+            ftrans_matrix[rows] = self.window_sums(block[rows], window_size) / ftrans_reference
+        return ftrans_matrix
 
     def calc_window_size(self, window_size):
-        end_wlgth, _ = self.find_nearest(self.wavelength[0] + window_size)
+        end_wlgth = self.wavelength_axis.nearest(self.wavelength[0] + window_size)
         return end_wlgth
 
     def calc_fit_range(self):
         # self.ec_ids == []
         ref = self.transmission[min(self.ec_ids)]
-        cutoff, _ = self.find_nearest(700)
+        cutoff = self.wavelength_axis.nearest(700)
         fft_ref = self.fft_smooth(ref)
         derivative_fft = np.gradient(fft_ref)
 
@@ -106,56 +201,67 @@ class OptoDatasetB:
     def calc_auto_fit(self):
         if not self.fit_range:
             self.fit_range = self.calc_fit_range()
-        fit_lbd = {}
         start, stop = self.fit_range[0], self.fit_range[1]
-        wavelength_cut = np.array(self.wavelength[start:stop])
-        for ec_id in self.transmission:
-            data_cut = self.transmission[ec_id][start:stop]
-            y_line = self.calc_fit(wavelength_cut, data_cut)
-            idx = np.argmin(y_line)
-            fit_lbd[ec_id] = wavelength_cut[idx]
-        return fit_lbd
+        return self.fit_minima(self.transmission, start, stop)
 
     def fit_min(self, transmission):
-        fit_lbd = {}
         if not self.fit_range:
             self.fit_range = self.calc_fit_range()
-        start, _ = self.find_nearest(self.fit_range[0])
-        stop, _ = self.find_nearest(self.fit_range[1])
+        pixels = self.wavelength_axis.to_slice(self.fit_range[0], self.fit_range[1])
+        return self.fit_minima(transmission, pixels.start, pixels.stop)
+
+    def fit_minima(self, transmission, start, stop):
+        """
+        fitting quadratic polynomial to all spectra, one least-squares operation per block of spectra
+        :param transmission: dict-like with spectra, keys are ec_ids
+        :param start: first pixel of fit range
+        :param stop: pixel after the fit range
+        :return: dict with wavelength of fit minimum for each ec_id
+        """
+        ec_ids = list(transmission)
+        if not ec_ids:
+            return {}
         wavelength_cut = np.array(self.wavelength[start:stop])
-        for ec_id in transmission:
-            data_cut = transmission[ec_id][start:stop]
-            y_line = self.calc_fit(wavelength_cut, data_cut)
-            idx = np.argmin(y_line)
-            fit_lbd[ec_id] = wavelength_cut[idx]
-        return fit_lbd
+        if self.quadratic_fit is None or not self.quadratic_fit.matches(wavelength_cut):
+            self.quadratic_fit = QuadraticFit(wavelength_cut)
+        data_cut = self.stack_spectra(transmission)[:, start:stop]
+        idx = np.empty(data_cut.shape[0], dtype=np.intp)
+        for row in range(0, data_cut.shape[0], CHECKPOINT_ROWS):
+            checkpoint()
+            rows = slice(row, row + CHECKPOINT_ROWS)
+            idx[rows] = self.quadratic_fit.argmin(data_cut[rows])
+        return dict(zip(ec_ids, wavelength_cut[idx]))
 
     def calc_min(self, transmission):
-        min_lbd = {}
-        for ec_id in transmission:
-            cutout = transmission[ec_id][self.fit_range[0]:self.fit_range[1]]
-            cutout_smooth = self.fft_smooth(cutout)
-            min_id = np.where(cutout_smooth == min(cutout_smooth))
-            idx = self.fit_range[0]+min_id[0][0]
-            min_lbd[ec_id] = self.wavelength[idx]
+        """
+        wavelength of smoothed transmission minimum within fit range, for all spectra at once
+        :param transmission: SpectraMatrix or dict with spectra, keys are ec_ids
+        :return: dict with minimum wavelength for each ec_id
+        """
+        ec_ids = list(transmission)
+        if not ec_ids:
+            return {}
+        start, stop = self.fit_range[0], self.fit_range[1]
+        cutout = self.stack_spectra(transmission)[:, start:stop]
+        cutout_smooth = self.fft_smooth(cutout, axis=1, workers=self.fft_workers)
+        # argmin picks the first pixel of equal minima
+        idx = start + np.argmin(cutout_smooth, axis=1)
+        min_lbd = dict(zip(ec_ids, np.asarray(self.wavelength)[idx]))
         return min_lbd
 
     def insert_opto_from_csv(self, data_in):
-        for num, opto_data in enumerate(data_in):
-            self.transmission[num] = opto_data[2:]
+        self.transmission = SpectraMatrix(np.asarray(data_in)[:, 2:])
         self.fit_range = self.calc_fit_range()
         self.iodm_initial_range = [self.fit_range[0] - 100, self.fit_range[1] + 100]
 
     def find_nearest(self, value):
-        diff = [abs(element - value) for element in self.wavelength]
-        val_idx = diff.index(min(diff))
+        val_idx = self.wavelength_axis.nearest(value)
         val_real = self.wavelength[val_idx]
         return val_idx, val_real
 
-    def calc_fit(self, x_data, y_data):
-        popt, _ = curve_fit(self.quadratic_poly, x_data, y_data)
-        a, b, c = popt
-        fit_data = self.quadratic_poly(x_data, a, b, c)
+    @staticmethod
+    def calc_fit(x_data, y_data):
+        fit_data = QuadraticFit(x_data).fit(np.atleast_2d(y_data))[0]
         return fit_data
 
     @staticmethod
@@ -176,13 +282,8 @@ class OptoDatasetB:
         return idx_max_p
 
     @staticmethod
-    def fft_smooth(X):
-        sigma = 40
-        m = 1
-        win = np.roll(general_gaussian(X.shape[0], m, sigma), X.shape[0] // 2)
-        fX = np.fft.fft(X)
-        Xf = np.real(np.fft.ifft(fX * win))
-        return Xf
+    def fft_smooth(X, axis=-1, workers=None):
+        return fft_smooth(X, sigma=40, m=1, axis=axis, workers=workers)
 
 
 class OptoCycleDataset(OptoDatasetB):
@@ -192,8 +293,10 @@ class OptoCycleDataset(OptoDatasetB):
 
     def insert_opto_from_csv(self, data_in, cycle):
         self.ec_ids = list(range(cycle[0], cycle[1]+1))
-        self.transmission = dict(zip(self.ec_ids, data_in))
-        if len(self.ec_ids) != data_in.shape[0]:
+        if not isinstance(data_in, SpectraMatrix):
+            data_in = SpectraMatrix(data_in, first_id=cycle[0])
+        self.transmission = data_in.id_range(cycle[0], cycle[1])
+        if len(self.ec_ids) != len(data_in):
             logging.warning("numbers of measurements between ec and opto files don't match")
         self.fit_range = self.calc_fit_range()
         self.iodm_initial_range = [self.fit_range[0]-100, self.fit_range[1]+100]
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import logging
+import os
+import numpy as np
+
+CACHE_VERSION = 2
+FINGERPRINT_BLOCK = 1 << 16
+
+
+def file_fingerprint(filename):
+    """
+    identity of a file's current content: path, size, modification time and a hash of its first and last blocks
+    :param filename: string path to file
+    :return: dict
+    """
+    stat = os.stat(filename)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(filename, 'rb') as data:
+        digest.update(data.read(FINGERPRINT_BLOCK))
+        if stat.st_size > FINGERPRINT_BLOCK:
+            data.seek(max(stat.st_size - FINGERPRINT_BLOCK, FINGERPRINT_BLOCK))
+            digest.update(data.read(FINGERPRINT_BLOCK))
+    return {'path': os.path.abspath(filename),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'content': digest.hexdigest()}
+
+
+class ParseCache:
+    def __init__(self, filename, kind):
+        """
+        sidecar directory with parsed arrays of a csv file, stored as .npy files next to the source
+        self.filename - string with full path to the source file
+        self.kind - string naming the parser, e.g. 'opto' or 'ec'
+        self.directory - string with path to the cache directory
+        """
+        self.filename = os.path.abspath(filename)
+        self.kind = kind
+        root, fname = os.path.split(self.filename)
+        self.directory = os.path.join(root, ".{}.tmscache".format(fname))
+
+    def meta_path(self):
+        return os.path.join(self.directory, "{}.json".format(self.kind))
+
+    def array_path(self, name):
+        return os.path.join(self.directory, "{}_{}.npy".format(self.kind, name))
+
+    def load_array(self, name):
+        try:
+            return np.asarray(np.load(self.array_path(name), mmap_mode='r'))
+        except ValueError:
+            # empty arrays can't be memory mapped
+            return np.load(self.array_path(name))
+
+    def key(self, params):
+        return {'version': CACHE_VERSION,
+                'kind': self.kind,
+                'params': params,
+                'source': file_fingerprint(self.filename)}
+
+    def load(self, key):
+        """
+        :param key: dict from self.key describing the current source file
+        :return: dict with memory mapped arrays, None if there is no up-to-date cache entry
+        """
+        try:
+            with open(self.meta_path()) as meta_file:
+                meta = json.load(meta_file)
+            if meta['key'] != key:
+                logging.info("parse cache of {} is stale".format(os.path.basename(self.filename)))
+                return None
+            return {name: self.load_array(name) for name in meta['arrays']}
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def store(self, arrays, key):
+        """
+        :param arrays: dict with numpy arrays to be cached
+        :param key: dict from self.key, taken before the source file was parsed
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if os.path.exists(self.meta_path()):
+                os.remove(self.meta_path())
+            for name, array in arrays.items():
+                tmp_path = self.array_path(name) + ".tmp"
+                with open(tmp_path, 'wb') as array_file:
+                    np.save(array_file, np.ascontiguousarray(array))
+                os.replace(tmp_path, self.array_path(name))
+            meta = {'key': key, 'arrays': list(arrays)}
+            tmp_path = self.meta_path() + ".tmp"
+            with open(tmp_path, 'w') as meta_file:
+                json.dump(meta, meta_file)
+            os.replace(tmp_path, self.meta_path())
+        except OSError:
+            logging.warning("unable to write parse cache for {}".format(os.path.basename(self.filename)))
+
+
+def cached_parse(filename, kind, parse, params=None, use_cache=True):
+    """
+    returning parsed arrays of a file from its sidecar cache, parsing and caching them if missing or stale
+    :param filename: string path to file
+    :param kind: string naming the parser
+    :param parse: function returning dict with numpy arrays, or None if the file can't be parsed
+    :param params: json-serializable parser parameters
+    :param use_cache: if False the file is always parsed and nothing is stored
+    :return: dict with numpy arrays, None if the file can't be parsed
+    """
+    if not use_cache:
+        return parse()
+    cache = ParseCache(filename, kind)
+    key = cache.key(params)
+    arrays = cache.load(key)
+    if arrays is None:
+        arrays = parse()
+        if arrays is not None:
+            cache.store(arrays, key)
+    return arrays
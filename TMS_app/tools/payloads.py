@@ -0,0 +1,36 @@
+from types import MappingProxyType
+import numpy as np
+
+# fields of the data sent to the gui with each plotting order; arrays are given by their number of dimensions,
+# other fields by None; 'limits' are the axis limits of a zoomed plot the data was prepared for, None for whole data
+SCHEMAS = {
+    "draw ec": {'cycle': None, 'limits': None, 'V': 1, 'uA': 1},
+    "draw opto": {'cycle': None, 'limits': None, 'wavelength': 1, 'spectra': 2},
+    "draw opto image": {'cycle': None, 'limits': None, 'image': 2, 'extent': None},
+    "fit λ(V)": {'cycle': None, 'x': 1, 'y': 1},
+    "IODM(V)": {'cycle': None, 'x': 1, 'y': 1},
+    "fit λ(V)+IODM(V)": {'cycle': None, 'V': 1, 'lbd': 1, 'iodm': 1},
+}
+
+
+def payload(order, **fields):
+    """
+    plot-ready data of an order sent to the gui; arrays are read-only float copies, so the gui holds no references
+    to model data and draws them without further processing
+    :param order: key of SCHEMAS
+    :param fields: values of all fields of the order's schema
+    :return: read-only mapping field -> value
+    :raise ValueError: if fields don't match the schema
+    """
+    schema = SCHEMAS[order]
+    if set(fields) != set(schema):
+        raise ValueError("{} needs fields {}, got {}".format(order, sorted(schema), sorted(fields)))
+    data = {}
+    for name, value in fields.items():
+        if schema[name] is not None:
+            value = np.array(value, dtype=float)
+            if value.ndim != schema[name]:
+                raise ValueError("{} field {} has to be {}D".format(order, name, schema[name]))
+            value.flags.writeable = False
+        data[name] = value
+    return MappingProxyType(data)
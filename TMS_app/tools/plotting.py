@@ -0,0 +1,117 @@
+import matplotlib
+import matplotlib.ticker as mtick
+import numpy as np
+
+
+def autoscale(ax, bounds=None):
+    """
+    fitting axis limits to the data of ax, rounded out to tick values so that similar cycles keep the same limits
+    :param ax: matplotlib Axes
+    :param bounds: [(x min, y min), (x max, y max)] of data not held by lines, e.g. in a LineCollection
+    """
+    ax.relim()
+    if bounds is not None:
+        ax.update_datalim(bounds)
+    with matplotlib.rc_context({'axes.autolimit_mode': 'round_numbers'}):
+        ax.autoscale_view()
+
+
+def round_limits(low, high):
+    """
+    :return: (low, high) rounded out to tick values, e.g. for color limits
+    """
+    with matplotlib.rc_context({'axes.autolimit_mode': 'round_numbers'}):
+        return tuple(mtick.MaxNLocator().view_limits(low, high))
+
+
+def data_bounds(x, y):
+    """
+    :return: [(x min, y min), (x max, y max)] of finite values, None if there are none
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    x, y = x[np.isfinite(x)], y[np.isfinite(y)]
+    if not x.size or not y.size:
+        return None
+    return [(x.min(), y.min()), (x.max(), y.max())]
+
+
+class FigureUpdater:
+    def __init__(self, canvas):
+        """
+        redrawing a figure whose axes and artists are kept and updated in place;
+        updated artists are animated and drawn over a cached background of the figure, so a redraw with unchanged
+        axis limits only blits the figure, a redraw with new limits recomputes the layout and draws everything
+        self.canvas - FigureCanvas of the figure
+        self.artists - list of animated artists, drawn over the background
+        self.background - saved figure without the animated artists, None before the first draw
+        self.limits - axis limits of the last full draw
+        self.full_draws, self.blits - numbers of redraws of each kind
+        """
+        self.canvas = canvas
+        self.figure = canvas.figure
+        self.artists = []
+        self.background = None
+        self.limits = None
+        self.full_draws = 0
+        self.blits = 0
+        # also run when tkinter redraws the canvas, e.g. after resizing the window
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+        # saved figures, e.g. from the toolbar, are drawn in full with all artists
+        self._savefig = self.figure.savefig
+        self.figure.savefig = self.savefig
+
+    def animate(self, *artists):
+        for artist in artists:
+            artist.set_animated(True)
+            self.artists.append(artist)
+
+    def clear(self):
+        """
+        forgetting artists and limits, after the figure was cleared
+        """
+        self.artists = []
+        self.background = None
+        self.limits = None
+
+    def on_draw(self, event):
+        # draws of saved figures are made by other canvases or at another resolution
+        if event.canvas is not self.canvas or self.canvas.is_saving():
+            return
+        # full draws also follow toolbar zooming and window resizing
+        self.limits = self.axes_limits()
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.draw_artists()
+
+    def savefig(self, *args, **kwargs):
+        """
+        Figure.savefig with the animated artists drawn like the others; they are left out of saved figures otherwise
+        """
+        for artist in self.artists:
+            artist.set_animated(False)
+        try:
+            return self._savefig(*args, **kwargs)
+        finally:
+            for artist in self.artists:
+                artist.set_animated(True)
+            self.background = None
+
+    def draw_artists(self):
+        for artist in self.artists:
+            self.figure.draw_artist(artist)
+
+    def axes_limits(self):
+        return tuple(tuple(ax.get_xlim()) + tuple(ax.get_ylim()) for ax in self.figure.axes)
+
+    def redraw(self):
+        limits = self.axes_limits()
+        if self.background is None or limits != self.limits:
+            self.limits = limits
+            self.full_draws += 1
+            self.figure.tight_layout()
+            self.canvas.draw()
+        else:
+            self.blits += 1
+            self.canvas.restore_region(self.background)
+            self.draw_artists()
+            self.canvas.blit(self.figure.bbox)
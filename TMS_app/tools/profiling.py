@@ -0,0 +1,164 @@
+import csv
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+SPAN_FIELDS = ['stage', 'parent', 'file', 'cycle', 'process', 'thread', 'start', 'wall', 'cpu', 'bytes_read',
+               'bytes_written', 'items']
+TOTAL_FIELDS = ['wall', 'cpu', 'bytes_read', 'bytes_written', 'items']
+
+
+class NoSpan:
+    """
+    span of a disabled profiler; shared by all stages and doing nothing
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def count(self, items=0, bytes_read=0, bytes_written=0):
+        pass
+
+
+NO_SPAN = NoSpan()
+
+
+class Span:
+    def __init__(self, profiler, stage, file=None, cycle=None):
+        """
+        measurement of one stage for one file and cycle, added to the profiler when it ends
+        self.record - dict with SPAN_FIELDS; wall and cpu time in seconds, cpu time of the running thread only,
+        start in seconds since the origin of the profiler, parent is the stage of the enclosing span or None
+        """
+        self.profiler = profiler
+        self.record = {'stage': stage, 'parent': None, 'file': None if file is None else os.path.basename(file),
+                       'cycle': cycle, 'process': os.getpid(), 'thread': threading.current_thread().name,
+                       'start': 0.0, 'wall': 0.0, 'cpu': 0.0, 'bytes_read': 0, 'bytes_written': 0, 'items': 0}
+
+    def __enter__(self):
+        open_spans = self.profiler.open_spans()
+        if open_spans:
+            self.record['parent'] = open_spans[-1].record['stage']
+        open_spans.append(self)
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.record['wall'] = time.perf_counter() - self._wall
+        self.record['cpu'] = time.thread_time() - self._cpu
+        self.record['start'] = self._wall - self.profiler.origin
+        self.profiler.open_spans().remove(self)
+        self.profiler.spans.append(self.record)
+        return False
+
+    def count(self, items=0, bytes_read=0, bytes_written=0):
+        self.record['items'] += int(items)
+        self.record['bytes_read'] += int(bytes_read)
+        self.record['bytes_written'] += int(bytes_written)
+
+
+class Profiler:
+    def __init__(self, enabled=False):
+        """
+        collecting spans of analysis stages; a disabled profiler hands out NO_SPAN and records nothing
+        self.enabled - bool
+        self.spans - list of span records (dicts with SPAN_FIELDS) in order of their end; spans may nest
+        self.origin - perf_counter time that span starts are relative to
+        self.epoch - time.time() at self.origin, for aligning spans of other processes
+        """
+        self.enabled = enabled
+        self.spans = []
+        self.origin = time.perf_counter()
+        self.epoch = time.time()
+        self._local = threading.local()
+
+    def span(self, stage, file=None, cycle=None):
+        """
+        :param stage: name of the measured stage
+        :param file: string path to the processed file
+        :param cycle: name of the processed cycle
+        :return: context manager measuring the stage; its count() adds items and bytes
+        """
+        if not self.enabled:
+            return NO_SPAN
+        return Span(self, stage, file, cycle)
+
+    def open_spans(self):
+        """
+        :return: list of spans of the current thread that haven't ended, innermost last
+        """
+        if not hasattr(self._local, 'spans'):
+            self._local.spans = []
+        return self._local.spans
+
+    def count(self, items=0, bytes_read=0, bytes_written=0):
+        """
+        adding items and bytes to the innermost span of the current thread, e.g. from code reading a file
+        """
+        if self.enabled and self.open_spans():
+            self.open_spans()[-1].count(items, bytes_read, bytes_written)
+
+    def clear(self):
+        self.spans = []
+        self.origin = time.perf_counter()
+        self.epoch = time.time()
+
+    def extend(self, spans, epoch=None):
+        """
+        adding spans recorded elsewhere, e.g. by a worker process
+        :param spans: list of span records
+        :param epoch: epoch of the profiler that recorded the spans; their starts are moved to this profiler's origin
+        """
+        shift = 0.0 if epoch is None else epoch - self.epoch
+        self.spans.extend(dict(span, start=span['start'] + shift) for span in spans)
+
+    def summary(self):
+        """
+        :return: dict stage -> dict with number of spans, totals of their measurements and the stage they are nested
+        in (None for top-level stages, also for stages run by other threads, e.g. prefetching); times of nested stages
+        are also part of the times of their parents, bytes and items are counted by the innermost span only
+        """
+        totals = defaultdict(lambda: {'spans': 0, 'parent': None, 'wall': 0.0, 'cpu': 0.0, 'bytes_read': 0,
+                                      'bytes_written': 0, 'items': 0})
+        for span in self.spans:
+            total = totals[span['stage']]
+            total['spans'] += 1
+            total['parent'] = span.get('parent')
+            for field in TOTAL_FIELDS:
+                total[field] += span[field]
+        return dict(totals)
+
+    def log_summary(self):
+        """
+        logging totals of top-level stages, each followed by the stages nested in it
+        """
+        summary = self.summary()
+
+        def log_stages(parent, indent):
+            stages = [(stage, total) for stage, total in summary.items() if total['parent'] == parent]
+            for stage, total in sorted(stages, key=lambda item: -item[1]['wall']):
+                logging.info("{}{}: {} x, {:.3f} s wall, {:.3f} s cpu, {:.1f} MB read, {:.1f} MB written, "
+                             "{} items".format(indent, stage, total['spans'], total['wall'], total['cpu'],
+                                               total['bytes_read'] / 2 ** 20, total['bytes_written'] / 2 ** 20,
+                                               total['items']))
+                log_stages(stage, indent + '    ')
+        log_stages(None, '')
+
+    def export(self, filename):
+        """
+        writing spans to a .csv file, or to a .json file with spans and summary for any other extension
+        :param filename: string path to file
+        """
+        with open(filename, 'w', newline='', encoding='utf-8') as file:
+            if filename.lower().endswith('.csv'):
+                writer = csv.DictWriter(file, fieldnames=SPAN_FIELDS)
+                writer.writeheader()
+                writer.writerows(self.spans)
+            else:
+                json.dump({'spans': self.spans, 'summary': self.summary()}, file, indent=1, ensure_ascii=False)
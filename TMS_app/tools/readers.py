@@ -0,0 +1,167 @@
+from itertools import islice
+import io
+import logging
+import re
+import numpy as np
+from TMS_app.tools.commands import checkpoint
+
+CHUNK_ROWS = 4096
+COUNT_BUFFER = 1 << 20
+CYCLE_ROW = re.compile(r'\nCycle')
+
+
+class OptoParseError(ValueError):
+    """
+    rows of an optical file that cannot be parsed; the message names the file and the rows
+    """
+
+
+def line_offsets(filename):
+    """
+    one pass index of a text file, scanning it in large binary blocks
+    :param filename: string path to file
+    :return: int64 array with byte offset of the start of every line, followed by the file size;
+    line k spans bytes offsets[k]:offsets[k+1]
+    """
+    starts = [np.zeros(1, dtype=np.int64)]
+    position = 0
+    with open(filename, 'rb') as data:
+        while True:
+            block = data.read(COUNT_BUFFER)
+            if not block:
+                break
+            newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord('\n'))
+            starts.append(newlines.astype(np.int64) + position + 1)
+            position += len(block)
+    offsets = np.concatenate(starts)
+    if offsets[-1] != position:
+        # last line without newline
+        offsets = np.append(offsets, position)
+    return offsets
+
+
+def parse_opto_rows(rows, n_rows, skip_columns=2):
+    """
+    parsing lines of an optical csv file in bulk, chunk by chunk, straight into a preallocated array
+    :param rows: iterator over lines
+    :param n_rows: maximal number of lines to parse
+    :param skip_columns: number of leading columns that are not part of the spectrum
+    :return: 2D int64 array, one spectrum per row
+    :raise ValueError: for rows that are not comma separated integers or have varying length
+    """
+    first_line = next(rows, None)
+    if first_line is None or n_rows <= 0:
+        return np.empty((0, 0), dtype=np.int64)
+    n_columns = first_line.count(',') + 1
+    matrix = np.empty((n_rows, n_columns - skip_columns), dtype=np.int64)
+    chunk, row = [first_line], 0
+    while chunk:
+        checkpoint()
+        block = np.loadtxt(chunk, delimiter=',', dtype=np.int64, comments=None, ndmin=2)
+        if block.shape != (len(chunk), n_columns):
+            raise ValueError("rows of varying length")
+        matrix[row:row + len(chunk)] = block[:, skip_columns:]
+        row += len(chunk)
+        chunk = list(islice(rows, min(CHUNK_ROWS, n_rows - row)))
+    return matrix[:row]
+
+
+def read_opto_rows(filename, offsets, first_row=0, last_row=None, skip_columns=2):
+    """
+    parsing rows first_row..last_row (inclusive) of an optical csv file, reading only their bytes
+    :param filename: string path to file
+    :param offsets: array from line_offsets(filename)
+    :param first_row: number of the first row to read
+    :param last_row: number of the last row to read, last row of file if None
+    :param skip_columns: number of leading columns that are not part of the spectrum
+    :return: 2D int64 array, one spectrum per row
+    :raise ValueError: for rows that are not comma separated integers or have varying length
+    """
+    total_rows = len(offsets) - 1
+    if last_row is None or last_row >= total_rows:
+        last_row = total_rows - 1
+    if first_row > last_row:
+        return np.empty((0, 0), dtype=np.int64)
+    with open(filename, 'rb') as data:
+        data.seek(int(offsets[first_row]))
+        text = data.read(int(offsets[last_row + 1] - offsets[first_row])).decode()
+    return parse_opto_rows(io.StringIO(text, newline=None), last_row - first_row + 1, skip_columns)
+
+
+def read_opto_pixels(filename, skip_columns=2):
+    """
+    :param filename: string path to file
+    :param skip_columns: number of leading columns that are not part of the spectrum
+    :return: number of pixels of a spectrum, taken from the first row; 0 for empty file
+    :raise ValueError: if the first row is not comma separated integers
+    """
+    with open(filename) as data:
+        first_line = data.readline()
+    if not first_line:
+        return 0
+    return parse_opto_rows(iter([first_line]), 1, skip_columns).shape[1]
+
+
+def count_rows(text):
+    return text.count('\n') + (1 if text and not text.endswith('\n') else 0)
+
+
+def parse_ec_csv(filename):
+    """
+    parsing electrochemical csv file with 'Cycle N, N' rows separating cycles;
+    cycle rows are located with a string search and the numeric blocks between them are parsed in bulk
+    :param filename: string path to file
+    :return: dict with arrays: V, uA - all measurements, NaN for rows with 'None'; names - cycle names;
+    offsets - measurements of cycle k are V[offsets[k]:offsets[k+1]]; ids - [first, last] measurement ids of each cycle;
+    None if the file is not an ec file
+    """
+    with open(filename) as data:
+        text = data.read()
+    header_starts = [0] if text.startswith('Cycle') else []
+    header_starts += [match.start() + 1 for match in CYCLE_ROW.finditer(text)]
+    header_ends = [text.find('\n', start) % (len(text) + 1) for start in header_starts]
+    segments = [text[:header_starts[0]] if header_starts else text]
+    segments += [text[end + 1:stop] for end, stop in zip(header_ends, header_starts[1:] + [len(text)])]
+    rows = [count_rows(segment) for segment in segments]
+    n_rows = sum(rows)
+
+    V = np.empty(n_rows, dtype=float)
+    uA = np.empty(n_rows, dtype=float)
+    row = 0
+    for segment, segment_rows in zip(segments, rows):
+        if not segment_rows:
+            continue
+        try:
+            block = np.loadtxt(io.StringIO(segment.replace('None', 'nan')), delimiter=',', comments=None, ndmin=2)
+        except ValueError:
+            logging.warning("this doesn't seem like the right type of file")
+            return None
+        if block.shape != (segment_rows, 2):
+            logging.error("wrong file type")
+            return None
+        V[row:row + segment_rows] = block[:, 0]
+        uA[row:row + segment_rows] = block[:, 1]
+        row += segment_rows
+
+    corrupted = np.isnan(V) | np.isnan(uA)
+    if corrupted.any():
+        logging.warning("file might be corrupted: {} measurements without data".format(np.count_nonzero(corrupted)))
+        V[corrupted] = np.nan
+        uA[corrupted] = np.nan
+
+    if header_starts:
+        names = [text[start:end].split(', ')[0] for start, end in zip(header_starts, header_ends)]
+        # measurements preceding the first cycle row belong to the first cycle
+        first_ids = np.cumsum(rows[:-1])
+        offsets = np.concatenate([[0], first_ids[1:], [n_rows]])
+        ids = np.column_stack([first_ids, np.append(first_ids[1:], n_rows) - 1])
+    else:
+        # if ec file has no info on cycles then a single "cycle 0" is created
+        names = ['Cycle 0']
+        offsets = np.array([0, n_rows])
+        ids = np.array([[0, n_rows - 1]])
+    return {'V': V,
+            'uA': uA,
+            'names': np.array(names),
+            'offsets': offsets.astype(np.int64),
+            'ids': ids.astype(np.int64)}
@@ -0,0 +1,79 @@
+from collections import OrderedDict
+
+
+class ResultCache:
+    def __init__(self, maxsize=32):
+        """
+        least recently used cache of large per-cycle results, e.g. boundary spectra
+        self.maxsize - maximal number of kept entries
+        self.entries - OrderedDict; keys are tuples (source fingerprint, cycle, analysis parameters, iodm range),
+        values are dicts filled with results as they are calculated, e.g. 'boundary'
+        """
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def entry(self, key):
+        """
+        :param key: hashable tuple describing the data and parameters of the results
+        :return: dict with results of key, an empty one that can be filled if there were none
+        """
+        try:
+            entry = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            entry = self.entries[key] = {}
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return entry
+
+    def clear(self):
+        self.entries.clear()
+
+
+class CycleResults:
+    def __init__(self):
+        """
+        per-cycle analysis results of the loaded files, kept for all of their cycles; the results are a few values per
+        spectrum, so cycles whose spectra were evicted from memory don't have to be loaded and analysed again
+        self.source - fingerprint of the files the kept results come from
+        self.entries - dict; keys are tuples (source fingerprint, cycle, analysis version) with the iodm range or
+        window size appended for IODM, values are dicts filled with results as they are calculated: 'fit_lbd',
+        'fit_range' of the cycle, 'iodm' and 'iodm_range' of the range
+        """
+        self.source = None
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def entry(self, key):
+        """
+        :param key: hashable tuple describing the data and parameters of the results, source fingerprint first
+        :return: dict with results of key, an empty one that can be filled if there were none
+        """
+        if key[0] != self.source:
+            # results of previously loaded files are dropped
+            self.entries.clear()
+            self.source = key[0]
+        try:
+            entry = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            entry = self.entries[key] = {}
+        else:
+            self.hits += 1
+        return entry
+
+    def clear(self):
+        self.entries.clear()
+        self.source = None
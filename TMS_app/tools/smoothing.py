@@ -0,0 +1,41 @@
+from functools import lru_cache
+import numpy as np
+from scipy import fft
+from scipy.signal.windows import general_gaussian
+
+
+@lru_cache(maxsize=64)
+def gaussian_kernel(length, sigma, m):
+    """
+    half-spectrum gaussian window for real FFT smoothing, memoized by (length, sigma, m)
+    :param length: number of samples along the smoothed axis
+    :param sigma: standard deviation of the window
+    :param m: shape parameter of scipy.signal.windows.general_gaussian
+    :return: read-only 1D array with length // 2 + 1 coefficients
+    """
+    win = np.roll(general_gaussian(length, m, sigma), length // 2)
+    # the real part of ifft(fft(x) * win) equals filtering with the symmetric part of win,
+    # which lets the smoothing use real FFTs without changing the result
+    kernel = 0.5 * (win + np.roll(win[::-1], 1))[:length // 2 + 1]
+    kernel.setflags(write=False)
+    return kernel
+
+
+def fft_smooth(data, sigma=40, m=1, axis=-1, workers=None):
+    """
+    gaussian low-pass filtering in the frequency domain
+    :param data: 1D spectrum or 2D block of spectra
+    :param sigma: standard deviation of the gaussian window
+    :param m: shape parameter of the gaussian window
+    :param axis: axis along which the data is smoothed
+    :param workers: number of threads used for the FFTs, one if None
+    :return: float array of data's shape
+    """
+    data = np.asarray(data, dtype=float)
+    length = data.shape[axis]
+    kernel = gaussian_kernel(length, sigma, m)
+    shape = [1] * data.ndim
+    shape[axis] = kernel.shape[0]
+    spectrum = fft.rfft(data, axis=axis, workers=workers)
+    spectrum *= kernel.reshape(shape)
+    return fft.irfft(spectrum, n=length, axis=axis, workers=workers)
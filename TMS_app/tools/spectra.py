@@ -0,0 +1,78 @@
+from collections.abc import Mapping
+from operator import index
+import numpy as np
+
+
+class SpectraMatrix(Mapping):
+    def __init__(self, data, first_id=0, step=1):
+        """
+        read-only mapping ec_id -> spectrum, backed by one 2D array
+        self.data - 2D numpy array, one spectrum per row
+        self.first_id - ec_id of the first row
+        self.step - difference of ec_ids between consecutive rows
+        """
+        self.data = np.asarray(data)
+        if self.data.ndim != 2:
+            raise ValueError("spectra matrix has to be 2D")
+        self.first_id = int(first_id)
+        self.step = int(step)
+
+    def row(self, ec_id):
+        try:
+            offset = index(ec_id) - self.first_id
+        except TypeError:
+            raise KeyError(ec_id)
+        row, remainder = divmod(offset, self.step)
+        if remainder or not 0 <= row < self.data.shape[0]:
+            raise KeyError(ec_id)
+        return row
+
+    def __getitem__(self, ec_id):
+        return self.data[self.row(ec_id)]
+
+    def __iter__(self):
+        return iter(range(self.first_id, self.first_id + self.step * len(self), self.step))
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    @property
+    def ids(self):
+        return np.arange(len(self)) * self.step + self.first_id
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def view(self, data, first_id=None, step=None):
+        first_id = self.first_id if first_id is None else first_id
+        step = self.step if step is None else step
+        return SpectraMatrix(data, first_id=first_id, step=step)
+
+    def id_range(self, first_id, last_id):
+        """
+        zero-copy view of spectra with first_id <= ec_id <= last_id
+        """
+        start = max(-(-(first_id - self.first_id) // self.step), 0)
+        stop = max((last_id - self.first_id) // self.step + 1, start)
+        return self.view(self.data[start:stop], first_id=self.first_id + start * self.step)
+
+    def subsample(self, step):
+        """
+        zero-copy view of every step-th spectrum
+        """
+        return self.view(self.data[::step], step=self.step * step)
+
+    def block(self, ec_ids=None):
+        """
+        2D array with spectra of given ec_ids; no copy is made for all ids in their own order
+        :param ec_ids: iterable with ec_ids, all spectra if None
+        :return: 2D numpy array, one spectrum per row
+        """
+        if ec_ids is None or ec_ids is self:
+            return self.data
+        rows = np.fromiter((self.row(ec_id) for ec_id in ec_ids), dtype=np.intp)
+        if rows.shape[0] == len(self) and (rows.shape[0] == 0 or
+                                           (rows[0] == 0 and np.all(np.diff(rows) == 1))):
+            return self.data
+        return self.data[rows]
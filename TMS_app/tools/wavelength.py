@@ -0,0 +1,47 @@
+import numpy as np
+
+
+class WavelengthAxis:
+    def __init__(self, wavelength):
+        """
+        wavelength axis with precomputed sorted index for nearest-pixel lookups
+        self.values - 1D array with wavelength of each pixel [nm]
+        self.order - pixel indices sorting self.values
+        self.sorted - self.values in ascending order
+        """
+        self.values = np.asarray(wavelength, dtype=float).ravel()
+        self.order = np.argsort(self.values, kind='stable')
+        self.sorted = self.values[self.order]
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    def nearest(self, lambda_nm):
+        """
+        binary search for the pixel closest to given wavelength; on a tie the lower wavelength wins
+        :param lambda_nm: scalar or array with wavelengths [nm]
+        :return: pixel index, or array of indices with shape of lambda_nm
+        """
+        if len(self) == 0:
+            raise ValueError("empty wavelength axis")
+        lambda_nm = np.asarray(lambda_nm, dtype=float)
+        if len(self) == 1:
+            idx = np.zeros(lambda_nm.shape, dtype=np.intp)
+        else:
+            right = np.clip(np.searchsorted(self.sorted, lambda_nm), 1, len(self) - 1)
+            left = right - 1
+            closer_left = lambda_nm - self.sorted[left] <= self.sorted[right] - lambda_nm
+            idx = self.order[np.where(closer_left, left, right)]
+        if idx.ndim == 0:
+            return int(idx)
+        return idx
+
+    def nearest_value(self, lambda_nm):
+        return self.values[self.nearest(lambda_nm)]
+
+    def to_slice(self, start_nm, stop_nm):
+        """
+        :return: slice of pixels from nearest to start_nm up to (excluding) nearest to stop_nm
+        """
+        start, stop = self.nearest([start_nm, stop_nm])
+        return slice(int(start), int(stop))
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+"""
+benchmark of the analysis on synthetic experiments of several sizes; times of parsers, fit range detection, fitting,
+IODM and csv export are taken from profiler spans, saved as json and compared with an earlier run
+
+    python -m scripts.benchmark [--scales small medium] [--repeat 3] [--output FILE] [--baseline FILE]
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+from TMS_app.batch import run_batch
+
+# spectra per cycle, pixels per spectrum, cycles, corrupted ec rows per cycle
+SCALES = {'small': {'spectra': 200, 'pixels': 512, 'cycles': 3, 'corrupted': 1},
+          'medium': {'spectra': 1000, 'pixels': 2048, 'cycles': 3, 'corrupted': 2},
+          'large': {'spectra': 4000, 'pixels': 2048, 'cycles': 5, 'corrupted': 5}}
+STAGES = ['read ec', 'read opto', 'load opto cycle', 'parse opto cycle', 'fit range', 'fit λ and IODM', 'fit', 'IODM',
+          'write csv', 'boundary spectra']
+WAVELENGTH = (344.6122, 1041.1877)
+DIP_CENTER = 700.0
+DIP_WIDTH = 40.0
+DIP_SHIFT = 4.0
+
+
+def dip_positions(V):
+    """
+    :return: wavelength of the resonance dip for each potential [nm]
+    """
+    return DIP_CENTER + DIP_SHIFT * np.asarray(V)
+
+
+def generate_experiment(directory, spectra=1000, pixels=2048, cycles=3, corrupted=0, seed=0, name='bench'):
+    """
+    writing a synthetic experiment: cyclic voltammetry in ech_pr_<name>.csv and one transmission spectrum per
+    measurement in opto_<name>.csv, with a resonance dip moving with the potential
+    :param directory: string path to directory for the files
+    :param spectra: number of measurements and spectra of each cycle
+    :param pixels: number of pixels of a spectrum
+    :param cycles: number of cycles
+    :param corrupted: number of 'None, None' measurements in each cycle after the first
+    :param seed: seed of the noise
+    :return: dict with paths of ec and optical files and 1D array with dip wavelength of each spectrum [nm]
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    ec_file = os.path.join(directory, f'ech_pr_{name}.csv')
+    opto_file = os.path.join(directory, f'opto_{name}.csv')
+    wavelength = np.linspace(*WAVELENGTH, num=pixels)
+    # lamp spectrum seen through the sensor, with a lorentzian dip of the resonance
+    lamp = 30000 * np.exp(-((wavelength - DIP_CENTER) / 250) ** 2) + 2000
+    phase = np.arange(spectra) / spectra
+    V = -0.5 + 1.5 * (1 - np.abs(2 * phase - 1))
+    dips = []
+    with open(ec_file, 'w') as ec, open(opto_file, 'w') as opto:
+        for cycle in range(cycles):
+            uA = 1e-5 * np.sin(2 * np.pi * phase) + rng.normal(0, 1e-7, spectra)
+            rows = [f'{v:.6f}, {i:.10e}' for v, i in zip(V, uA)]
+            if cycle:
+                for row in rng.choice(spectra, size=min(corrupted, spectra), replace=False):
+                    rows[row] = 'None, None'
+            ec.write(f'Cycle {cycle}, {cycle}\n' + '\n'.join(rows) + '\n')
+            centers = dip_positions(V)
+            dips.append(centers)
+            depth = 0.45 + 0.05 * np.sin(2 * np.pi * phase)[:, np.newaxis]
+            dip = 1 - depth / (1 + ((wavelength - centers[:, np.newaxis]) / DIP_WIDTH) ** 2)
+            transmission = lamp * dip + rng.normal(0, 40, (spectra, pixels))
+            ids = np.arange(cycle * spectra, (cycle + 1) * spectra)
+            np.savetxt(opto, np.column_stack([ids, np.zeros(spectra), transmission]).astype(np.int64), fmt='%d',
+                       delimiter=',')
+    return {'ec_file': ec_file, 'opto_file': opto_file, 'dips': np.concatenate(dips)}
+
+
+def fit_error(output_dir, name, dips, spectra):
+    """
+    :return: median distance of fitted minima from the dips of the experiment [nm], None without saved results
+    """
+    errors = []
+    for cycle in range(len(dips) // spectra):
+        filename = os.path.join(output_dir, f'{name}_Cycle {cycle}.csv')
+        try:
+            lbd = np.loadtxt(filename, delimiter=',', ndmin=2)[:, 2]
+        except OSError:
+            return None
+        expected = dips[cycle * spectra:(cycle + 1) * spectra]
+        if len(lbd) == len(expected):
+            errors.append(np.abs(lbd - expected))
+    if not errors:
+        return None
+    return float(np.nanmedian(np.concatenate(errors)))
+
+
+def run_scale(scale, repeat=3, workdir=None):
+    """
+    analysing a synthetic experiment repeat times, without parse caches
+    :param scale: name of scale in SCALES
+    :param repeat: number of runs; the fastest time of each stage is kept
+    :param workdir: directory for the experiment and results, a temporary one if None
+    :return: dict with parameters, size of files, best time of each stage and accuracy of the fit
+    """
+    params = SCALES[scale]
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        root = os.path.join(tmp, 'experiment')
+        output_dir = os.path.join(tmp, 'results')
+        start = time.perf_counter()
+        experiment = generate_experiment(os.path.join(root, scale), **params)
+        generation = time.perf_counter() - start
+        runs = []
+        for _ in range(repeat):
+            summary = run_batch(root, output_dir=output_dir, incremental=False, use_parse_cache=False, profile=True)
+            if summary['failed']:
+                raise RuntimeError("analysis of {} failed: {}".format(scale, summary['failed']))
+            runs.append(summary)
+        error = fit_error(os.path.join(output_dir, scale), 'bench', experiment['dips'], params['spectra'])
+        sizes = {'ec_bytes': os.path.getsize(experiment['ec_file']),
+                 'opto_bytes': os.path.getsize(experiment['opto_file'])}
+    stages = {}
+    for stage in STAGES:
+        measured = [run['profile'][stage] for run in runs if stage in run['profile']]
+        if measured:
+            best = min(measured, key=lambda total: total['wall'])
+            stages[stage] = {field: best[field] for field in ('parent', 'wall', 'cpu', 'bytes_read', 'bytes_written',
+                                                              'items')}
+    return {'params': params,
+            'files': sizes,
+            'generation': generation,
+            'total': min(run['timings']['total'] for run in runs),
+            'stages': stages,
+            'fit_error_nm': error}
+
+
+def run_benchmark(scales, repeat=3, workdir=None):
+    """
+    :return: dict with environment of the run and results of run_scale for each scale
+    """
+    results = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'python': platform.python_version(),
+               'numpy': np.__version__,
+               'platform': platform.platform(),
+               'cpus': os.cpu_count(),
+               'repeat': repeat,
+               'scales': {}}
+    for scale in scales:
+        logging.info("benchmarking {} experiment".format(scale))
+        results['scales'][scale] = run_scale(scale, repeat, workdir)
+    return results
+
+
+def compare(results, baseline, tolerance=0.25, min_seconds=0.01):
+    """
+    comparing stage times of two benchmark runs
+    :param results: dict from run_benchmark
+    :param baseline: dict from an earlier run_benchmark
+    :param tolerance: allowed relative slowdown of a stage
+    :param min_seconds: slowdowns smaller than this are noise
+    :return: (list of (scale, stage, baseline seconds, seconds) rows, list of regressed rows)
+    """
+    rows, regressions = [], []
+    for scale, result in results['scales'].items():
+        if scale not in baseline['scales']:
+            continue
+        old_result = baseline['scales'][scale]
+        pairs = [('total', old_result['total'], result['total'])]
+        pairs += [(stage, old_result['stages'][stage]['wall'], result['stages'][stage]['wall'])
+                  for stage in result['stages'] if stage in old_result['stages']]
+        for stage, old, new in pairs:
+            row = (scale, stage, old, new)
+            rows.append(row)
+            if new - old > max(tolerance * old, min_seconds):
+                regressions.append(row)
+    return rows, regressions
+
+
+def print_results(results, stream=sys.stderr):
+    for scale, result in results['scales'].items():
+        params = result['params']
+        stream.write("{}: {} cycles x {} spectra x {} pixels, {:.1f} MB; total {:.3f} s, fit error {}\n".format(
+            scale, params['cycles'], params['spectra'], params['pixels'], result['files']['opto_bytes'] / 2 ** 20,
+            result['total'], 'n/a' if result['fit_error_nm'] is None else '{:.3f} nm'.format(result['fit_error_nm'])))
+        for stage, total in result['stages'].items():
+            # nested stages are indented, their times are part of the times of their parent stages
+            name = stage if total.get('parent') is None else '  ' + stage
+            stream.write("    {:<18}{:>9.4f} s wall{:>9.4f} s cpu{:>10} items\n".format(
+                name, total['wall'], total['cpu'], total['items']))
+
+
+def print_comparison(rows, regressions, stream=sys.stderr):
+    for scale, stage, old, new in rows:
+        flag = '  <-- slower' if (scale, stage, old, new) in regressions else ''
+        ratio = new / old if old else float('inf')
+        stream.write("{:<8}{:<18}{:>9.4f} s ->{:>9.4f} s ({:.2f}x){}\n".format(scale, stage, old, new, ratio, flag))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m scripts.benchmark",
+                                     description="time the analysis on synthetic experiments")
+    parser.add_argument("-s", "--scales", nargs='+', choices=list(SCALES), default=['small', 'medium'],
+                        help="sizes of experiments (default: small medium)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="runs of each experiment (default: 3)")
+    parser.add_argument("-o", "--output", default=None, help="json file for results")
+    parser.add_argument("-b", "--baseline", default=None, help="json file with results of an earlier run to compare")
+    parser.add_argument("-t", "--tolerance", type=float, default=0.25,
+                        help="allowed relative slowdown of a stage compared with the baseline (default: 0.25)")
+    parser.add_argument("--workdir", default=None, help="directory for generated experiments (default: temporary)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log progress to stderr")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(stream=sys.stderr, level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s: %(message)s')
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+    results = run_benchmark(args.scales, max(1, args.repeat), args.workdir)
+    print_results(results)
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2, ensure_ascii=False)
+    if baseline is None:
+        return 0
+    rows, regressions = compare(results, baseline, args.tolerance)
+    print_comparison(rows, regressions)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
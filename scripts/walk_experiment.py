@@ -43,7 +43,7 @@ def analysis_full(root, ech_file, opto_file):
     _, iodm_array = zip(*iodm_dict.items())
     v = [ec_dataset.V[item] for item in ec_items]
     uA = [ec_dataset.uA[item] for item in ec_items]
-    ec_ids_transmission = {k: opto_dataset.transmission[k] for k in ec_items}
+    ec_ids_transmission = opto_dataset.transmission.id_range(0, len(ec_items) - 1)
     print('calculating min transmission')
     min_lbd_dict = opto_dataset.calc_min(ec_ids_transmission)
     _, lbd_min_array = zip(*min_lbd_dict.items())
@@ -52,7 +52,7 @@ def analysis_full(root, ech_file, opto_file):
     print('calculating iodm')
     iodm_dict, iodm_wavelength_start, iodm_wavelength_stop = opto_dataset.automatic_IODM(ec_items, 100)
     _, iodm_array = zip(*iodm_dict.items())
-    ec_ids_transmission = {k: opto_dataset.transmission[k] for k in ec_items}
+    ec_ids_transmission = opto_dataset.transmission.id_range(0, len(ec_items) - 1)
     print('calculating min transmission')
     min_lbd_dict = opto_dataset.calc_min(ec_ids_transmission)
     _, lbd_min_array = zip(*min_lbd_dict.items())